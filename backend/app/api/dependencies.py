@@ -3,6 +3,7 @@ Database connection and operations
 """
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from pymongo.errors import ConnectionFailure
 from app.core.config import settings
 
@@ -20,8 +21,17 @@ class Database:
     async def connect(self):
         """Connect to MongoDB"""
         try:
-            self.client = AsyncIOMotorClient(settings.mongodb_url)
-            self.database = self.client[settings.database_name]
+            if self.client is None:
+                self.client = AsyncIOMotorClient(
+                    settings.mongodb_url,
+                    maxPoolSize=settings.mongo_max_pool_size,
+                    minPoolSize=settings.mongo_min_pool_size,
+                    maxIdleTimeMS=settings.mongo_max_idle_time_ms,
+                    serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms,
+                    retryWrites=True,
+                    compressors=settings.mongo_compressors,
+                )
+                self.database = self.client[settings.database_name]
             
             # Test connection
             await self.client.admin.command('ping')
@@ -32,23 +42,30 @@ class Database:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise
     
+    async def ensure_indexes(self):
+        """Create indexes backing the hot video queries"""
+        await self.database["videos"].create_indexes([
+            IndexModel([("video_id", ASCENDING)], unique=True),
+            IndexModel([("created_at", DESCENDING), ("video_id", DESCENDING)]),
+            IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("video_id", DESCENDING)]),
+        ])
+        logger.info("MongoDB indexes ensured")
+    
     async def disconnect(self):
         """Disconnect from MongoDB"""
         if self.client:
             self.client.close()
+            self.client = None
+            self.database = None
             self._connected = False
             logger.info("Disconnected from MongoDB")
     
     def get_collection(self, collection_name: str):
         """Get a collection from the database"""
-        # Ensure minimal initialization without scheduling background tasks
+        # The shared client is created once in connect(); callers treat None as unavailable
         if self.database is None:
-            try:
-                self.client = AsyncIOMotorClient(settings.mongodb_url)
-                self.database = self.client[settings.database_name]
-            except Exception:
-                # Fallback to None; callers may have monkeypatched this instance in tests
-                return None
+            logger.warning(f"Database not connected; collection '{collection_name}' unavailable")
+            return None
         return self.database[collection_name]
 
 
@@ -59,6 +76,7 @@ database = Database()
 async def init_database():
     """Initialize database connection"""
     await database.connect()
+    await database.ensure_indexes()
 
 # Dependency for FastAPI
 async def get_database():
@@ -2,13 +2,17 @@
 FastAPI routes for video processing API
 """
 import os
+import re
+import time
 import uuid
 import logging
 from datetime import datetime
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
+from urllib.parse import quote
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Depends, Query
 import asyncio
-from fastapi.responses import FileResponse
+import aiofiles.os
+from fastapi.responses import FileResponse, Response
 from pydantic import ValidationError
 
 from app.models.schemas import (
@@ -19,7 +23,8 @@ from app.models import VideoDocument
 from app.services.storage import storage_service
 from app.services.video_processor import video_processor
 from app.services.transcription import transcription_service
-from app.tasks.worker import process_video_task, get_task_status
+from app.services.progress import progress_batcher
+from app.tasks.worker import USE_EAGER, enqueue_task, process_video_task, get_task_status
 from app.api.dependencies import database
 from app.core.config import settings
 
@@ -27,6 +32,69 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Read uploads in 1 MB chunks so large files never sit fully in memory
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Upload validation values derived from settings once at import
+ALLOWED_VIDEO_EXTENSIONS = frozenset(f".{fmt}" for fmt in settings.video_formats)
+MAX_UPLOAD_BYTES = settings.max_file_size_mb * 1024 * 1024
+UNSUPPORTED_FORMAT_DETAIL = f"Unsupported video format. Supported formats: {settings.video_formats}"
+
+# How often a long-polling status request re-reads a locally processed video
+STATUS_POLL_INTERVAL = 0.5
+
+# Fields the video list returns. The list only previews the transcription, so
+# fetch just its first segments (two, so the client can tell whether there is more)
+VIDEO_LIST_PROJECTION = {
+    "_id": 0,
+    "video_id": 1,
+    "filename": 1,
+    "status": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "original_path": 1,
+    "processed_path": 1,
+    "audio_path": 1,
+    "transcription": {"$slice": 2},
+    "caption_style": 1,
+    "error_message": 1,
+    "progress_percentage": 1,
+}
+
+
+def _file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=f"File too large. Maximum size: {settings.max_file_size_mb}MB"
+    )
+
+
+def _attachment_disposition(filename: str) -> str:
+    """Content-Disposition for a download: RFC 5987 filename* plus a quoted ASCII fallback"""
+    # Quotes, backslashes, control and non-ASCII characters can't go in the quoted form
+    fallback = re.sub(r'[^\x20-\x7e]|["\\]', "_", filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+
+def _is_within(path: str, directory: str) -> bool:
+    """Whether path resolves to somewhere inside directory"""
+    directory = os.path.abspath(directory)
+    try:
+        return os.path.commonpath([os.path.abspath(path), directory]) == directory
+    except ValueError:
+        # Different drives on Windows
+        return False
+
+
+async def _iter_upload_chunks(video_file: UploadFile, max_size: int) -> AsyncIterator[bytes]:
+    """Yield upload chunks, aborting once the running size exceeds max_size"""
+    total = 0
+    while chunk := await video_file.read(UPLOAD_CHUNK_SIZE):
+        total += len(chunk)
+        if total > max_size:
+            raise _file_too_large()
+        yield chunk
+
 
 @router.post("/upload", response_model=VideoUploadResponse)
 async def upload_video(
@@ -62,6 +130,8 @@ async def upload_video(
             padding=padding,
             position=position
         )
+        # Serialized once and shared by the document, the task and the local processor
+        style_dict = caption_style.model_dump(mode="python", exclude_none=True)
         
         video_path = None
         
@@ -72,23 +142,22 @@ async def upload_video(
             
             # Validate file type
             file_extension = os.path.splitext(video_file.filename)[1].lower()
-            if file_extension not in [f".{fmt}" for fmt in settings.video_formats]:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Unsupported video format. Supported formats: {settings.video_formats}"
-                )
-            
-            # Check file size
-            content = await video_file.read()
-            if len(content) > settings.max_file_size_mb * 1024 * 1024:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File too large. Maximum size: {settings.max_file_size_mb}MB"
-                )
+            if file_extension not in ALLOWED_VIDEO_EXTENSIONS:
+                raise HTTPException(status_code=400, detail=UNSUPPORTED_FORMAT_DETAIL)
             
-            # Generate unique filename
             filename = storage_service.generate_unique_filename(video_file.filename)
-            video_path = await storage_service.save_uploaded_file(content, filename)
+            if video_file.size is not None:
+                # Already spooled by the multipart parser: check size up front and
+                # copy file-to-file (in-kernel when the spool is on disk)
+                if video_file.size > MAX_UPLOAD_BYTES:
+                    raise _file_too_large()
+                video_path = await storage_service.save_uploaded_file(video_file.file, filename)
+            else:
+                # Size unknown: stream to disk, checking file size as chunks arrive
+                video_path = await storage_service.save_uploaded_file(
+                    _iter_upload_chunks(video_file, MAX_UPLOAD_BYTES),
+                    filename
+                )
             
         elif video_url:
             # Handle URL download
@@ -101,34 +170,40 @@ async def upload_video(
                     detail=f"Failed to download video from URL: {str(e)}"
                 )
         
+        # Assign the Celery task ID up front so it is stored with the initial insert
+        celery_task_id = None if settings.debug else str(uuid.uuid4())
+        
         # Create video document
         video_doc = VideoDocument(
             video_id=video_id,
-            filename=os.path.basename(video_path),
+            filename=filename,
             status="pending",
             original_path=video_path,
-            caption_style=caption_style.dict()
+            caption_style=style_dict,
+            celery_task_id=celery_task_id
         )
         
-        # Save to database
+        # Save to database and start processing
         collection = database.get_collection("videos")
         if collection is None:
             raise HTTPException(status_code=500, detail="Database not available")
-        await collection.insert_one(video_doc.dict())
         
-        # Start processing
         if settings.debug:
-            asyncio.create_task(_process_video_async(video_id, video_path, caption_style.dict()))
+            # The local processor updates this document, so insert it first
+            await collection.insert_one(video_doc.model_dump())
+            asyncio.create_task(_process_video_async(video_id, video_path, style_dict))
         else:
-            task = process_video_task.delay(
-                video_id=video_id,
-                video_path=video_path,
-                caption_style=caption_style.dict()
-            )
-            # Update document with task ID
-            await collection.update_one(
-                {"video_id": video_id},
-                {"$set": {"celery_task_id": task.id}}
+            # The worker only needs the task arguments, so the broker publish
+            # overlaps with the insert instead of following it
+            await asyncio.gather(
+                collection.insert_one(video_doc.model_dump()),
+                enqueue_task(
+                    process_video_task,
+                    celery_task_id,
+                    video_id=video_id,
+                    video_path=video_path,
+                    caption_style=style_dict
+                )
             )
         
         logger.info(f"Video upload initiated: {video_id}")
@@ -165,25 +240,37 @@ async def create_captions(request: CaptionRequest):
         if video_doc["status"] == "processing":
             raise HTTPException(status_code=409, detail="Video is already being processed")
         
-        # Update status to processing
-        await collection.update_one(
+        style_dict = request.caption_style.model_dump(mode="python", exclude_none=True)
+        
+        # Update status and task ID in a single write
+        celery_task_id = None if settings.debug else str(uuid.uuid4())
+        update_fields = {"status": "processing", "updated_at": datetime.utcnow()}
+        if celery_task_id:
+            update_fields["celery_task_id"] = celery_task_id
+        update_status = collection.update_one(
             {"video_id": request.video_id},
-            {"$set": {"status": "processing", "updated_at": datetime.utcnow()}}
+            {"$set": update_fields}
         )
         
         # Start processing
         if settings.debug:
-            asyncio.create_task(_process_video_async(request.video_id, video_doc["original_path"], request.caption_style.dict()))
+            await update_status
+            asyncio.create_task(_process_video_async(
+                request.video_id,
+                video_doc["original_path"],
+                style_dict,
+                mark_processing=False
+            ))
         else:
-            task = process_video_task.delay(
-                video_id=request.video_id,
-                video_path=video_doc["original_path"],
-                caption_style=request.caption_style.dict()
-            )
-            # Update document with task ID
-            await collection.update_one(
-                {"video_id": request.video_id},
-                {"$set": {"celery_task_id": task.id}}
+            await asyncio.gather(
+                update_status,
+                enqueue_task(
+                    process_video_task,
+                    celery_task_id,
+                    video_id=request.video_id,
+                    video_path=video_doc["original_path"],
+                    caption_style=style_dict
+                )
             )
         
         logger.info(f"Caption creation initiated for video: {request.video_id}")
@@ -206,10 +293,15 @@ async def create_captions(request: CaptionRequest):
 async def get_videos(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
-    status: Optional[str] = Query(None)
+    status: Optional[str] = Query(None),
+    after: Optional[datetime] = Query(None, description="created_at of the last video on the previous page"),
+    after_id: Optional[str] = Query(None, description="video_id of the last video on the previous page")
 ):
     """
     Get list of all videos with pagination
+    
+    Pass the previous response's next_after/next_after_id to page with an index
+    range scan instead of skipping over earlier pages.
     """
     try:
         collection = database.get_collection("videos")
@@ -221,40 +313,48 @@ async def get_videos(
         if status:
             query["status"] = status
         
-        # Get total count
-        total = await collection.count_documents(query)
-        
         # Get videos with pagination
-        skip = (page - 1) * page_size
-        cursor = collection.find(query).skip(skip).limit(page_size).sort("created_at", -1)
-        videos = await cursor.to_list(length=page_size)
-        
-        # Convert to response format
-        video_list = []
-        for video in videos:
-            video_info = VideoInfo(
-                video_id=video["video_id"],
-                filename=video["filename"],
-                status=video["status"],
-                created_at=video["created_at"],
-                updated_at=video["updated_at"],
-                original_path=video.get("original_path"),
-                processed_path=video.get("processed_path"),
-                audio_path=video.get("audio_path"),
-                transcription=video.get("transcription"),
-                caption_style=video.get("caption_style"),
-                error_message=video.get("error_message"),
-                progress_percentage=video.get("progress_percentage", 0)
-            )
-            video_list.append(video_info)
-        
-        return VideoListResponse(
-            videos=video_list,
-            total=total,
-            page=page,
-            page_size=page_size
+        if after is not None:
+            # Keyset pagination: resume strictly after the previous page's last video
+            keyset = [{"created_at": {"$lt": after}}]
+            if after_id:
+                keyset.append({"created_at": after, "video_id": {"$lt": after_id}})
+            cursor = collection.find({**query, "$or": keyset}, VIDEO_LIST_PROJECTION)
+        else:
+            skip = (page - 1) * page_size
+            cursor = collection.find(query, VIDEO_LIST_PROJECTION).skip(skip)
+        cursor = cursor.sort([("created_at", -1), ("video_id", -1)]).limit(page_size)
+        
+        # Count and page fetch run concurrently; an unfiltered count comes
+        # from collection metadata instead of an index walk
+        if query:
+            count_coro = collection.count_documents(query)
+        else:
+            count_coro = collection.estimated_document_count()
+        total, videos = await asyncio.gather(
+            count_coro,
+            cursor.to_list(length=page_size)
         )
         
+        # Cursor for the next page, if this one was full
+        next_after = next_after_id = None
+        if len(videos) == page_size:
+            next_after = videos[-1]["created_at"]
+            next_after_id = videos[-1]["video_id"]
+        
+        # Validate the projected documents and serialize the whole page in one
+        # pydantic-core pass each, instead of a VideoInfo per document followed
+        # by FastAPI re-validating and re-encoding the response model
+        video_list = VideoListResponse.model_validate({
+            "videos": videos,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "next_after": next_after,
+            "next_after_id": next_after_id,
+        })
+        return Response(content=video_list.model_dump_json(), media_type="application/json")
+        
     except Exception as e:
         logger.error(f"Error getting videos: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
@@ -276,7 +376,8 @@ async def get_video(video_id: str):
         
         # Get task status if processing
         if video.get("celery_task_id"):
-            task_status = get_task_status(video["celery_task_id"])
+            # A cache miss is a result-backend round trip, so keep it off the event loop
+            task_status = await asyncio.to_thread(get_task_status, video["celery_task_id"])
             video["progress_percentage"] = task_status.get("progress", 0)
             video["current_step"] = task_status.get("current_step", "")
         
@@ -311,6 +412,8 @@ async def download_video(video_id: str, type: str = Query("processed")):
     """
     try:
         collection = database.get_collection("videos")
+        if collection is None:
+            raise HTTPException(status_code=500, detail="Database not available")
         video = await collection.find_one({"video_id": video_id})
         
         if not video:
@@ -319,19 +422,45 @@ async def download_video(video_id: str, type: str = Query("processed")):
         # Determine file path
         if type == "original":
             file_path = video.get("original_path")
+            storage_dir = settings.upload_dir
         elif type == "processed":
             file_path = video.get("processed_path")
+            storage_dir = settings.processed_dir
         else:
             raise HTTPException(status_code=400, detail="Invalid type. Use 'original' or 'processed'")
         
-        if not file_path or not os.path.exists(file_path):
+        # A single stat both checks existence and gives FileResponse its headers
+        try:
+            stat_result = await aiofiles.os.stat(file_path) if file_path else None
+        except FileNotFoundError:
+            stat_result = None
+        if stat_result is None:
             raise HTTPException(status_code=404, detail="File not found")
         
-        filename = os.path.basename(file_path)
+        # The stored filename is the original's basename; processed files are named per video
+        filename = video.get("filename") if type == "original" else None
+        filename = filename or os.path.basename(file_path)
+        
+        # Behind nginx, hand the transfer to the proxy so the file never passes through Python
+        if settings.accel_redirect_prefix:
+            # Only files under the storage directory map onto the proxy's internal location
+            if not _is_within(file_path, storage_dir):
+                logger.warning(f"Refusing to redirect to {file_path}: outside {storage_dir}")
+                raise HTTPException(status_code=403, detail="File is outside the storage directory")
+            relative_path = os.path.relpath(file_path, storage_dir).replace(os.sep, "/")
+            return Response(
+                media_type="video/mp4",
+                headers={
+                    "X-Accel-Redirect": f"{settings.accel_redirect_prefix.rstrip('/')}/{type}/{relative_path}",
+                    "Content-Disposition": _attachment_disposition(filename)
+                }
+            )
+        
         return FileResponse(
             path=file_path,
             filename=filename,
-            media_type="video/mp4"
+            media_type="video/mp4",
+            stat_result=stat_result
         )
         
     except HTTPException:
@@ -342,21 +471,30 @@ async def download_video(video_id: str, type: str = Query("processed")):
 
 
 @router.get("/video/{video_id}/status")
-async def get_video_status(video_id: str):
+async def get_video_status(
+    video_id: str,
+    wait: bool = Query(False, description="Hold the request until processing finishes or the long-poll window closes")
+):
     """
     Get processing status for a video
     """
     try:
         collection = database.get_collection("videos")
+        if collection is None:
+            raise HTTPException(status_code=500, detail="Database not available")
         video = await collection.find_one({"video_id": video_id})
         
         if not video:
             raise HTTPException(status_code=404, detail="Video not found")
         
-        # Get task status if processing
+        waited = wait and video["status"] in ("pending", "processing")
+        if waited:
+            video = await _wait_for_video(collection, video)
+        
+        # Get task status if processing; skip the cache after a wait, it predates the change
         task_status = None
         if video.get("celery_task_id"):
-            task_status = get_task_status(video["celery_task_id"])
+            task_status = await asyncio.to_thread(get_task_status, video["celery_task_id"], not waited)
         
         return {
             "video_id": video_id,
@@ -374,6 +512,32 @@ async def get_video_status(video_id: str):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+async def _wait_for_video(collection, video: dict) -> dict:
+    """Hold until the video leaves pending/processing or the long-poll window closes"""
+    video_id = video["video_id"]
+    deadline = time.monotonic() + settings.status_long_poll_timeout
+    # Eager mode has no result backend to ask
+    task_id = video.get("celery_task_id") if not USE_EAGER else None
+    while time.monotonic() < deadline:
+        await asyncio.sleep(STATUS_POLL_INTERVAL)
+        if task_id:
+            # One short backend read per tick; blocking on AsyncResult.get would
+            # hold a default-executor thread for the whole long-poll window
+            task_status = await asyncio.to_thread(get_task_status, task_id, False)
+            if task_status["status"] in ("completed", "failed"):
+                break
+            continue
+        
+        # Otherwise progress only lands on the document, so watch that
+        video = await collection.find_one({"video_id": video_id}) or video
+        if video["status"] not in ("pending", "processing"):
+            break
+    
+    if task_id:
+        video = await collection.find_one({"video_id": video_id}) or video
+    return video
+
+
 @router.delete("/video/{video_id}")
 async def delete_video(video_id: str):
     """
@@ -381,21 +545,27 @@ async def delete_video(video_id: str):
     """
     try:
         collection = database.get_collection("videos")
+        if collection is None:
+            raise HTTPException(status_code=500, detail="Database not available")
         video = await collection.find_one({"video_id": video_id})
         
         if not video:
             raise HTTPException(status_code=404, detail="Video not found")
         
-        # Delete files
+        # Delete files concurrently without blocking the event loop
         files_to_delete = [
-            video.get("original_path"),
-            video.get("processed_path"),
-            video.get("audio_path")
+            file_path for file_path in (
+                video.get("original_path"),
+                video.get("processed_path"),
+                video.get("audio_path")
+            )
+            if file_path
         ]
         
-        for file_path in files_to_delete:
-            if file_path and os.path.exists(file_path):
-                storage_service.delete_file(file_path)
+        await asyncio.gather(*(
+            storage_service.delete_file(file_path)
+            for file_path in files_to_delete
+        ))
         
         # Delete from database
         await collection.delete_one({"video_id": video_id})
@@ -411,6 +581,31 @@ async def delete_video(video_id: str):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+# Monotonic time of the last successful database ping, shared by health probes
+_last_ping_ok_at: Optional[float] = None
+_ping_lock = asyncio.Lock()
+
+
+def _ping_is_fresh() -> bool:
+    return (
+        _last_ping_ok_at is not None
+        and time.monotonic() - _last_ping_ok_at < settings.health_check_cache_ttl
+    )
+
+
+async def _ping_database() -> None:
+    """Ping MongoDB unless a recent ping succeeded; raises if the ping fails"""
+    global _last_ping_ok_at
+    if _ping_is_fresh():
+        return
+    # Only one probe pings when the cached result expires
+    async with _ping_lock:
+        if _ping_is_fresh():
+            return
+        await database.client.admin.command('ping')
+        _last_ping_ok_at = time.monotonic()
+
+
 @router.get("/health")
 async def health_check():
     """
@@ -425,7 +620,7 @@ async def health_check():
                 "database": "connected",
                 "timestamp": datetime.utcnow()
             }
-        await database.client.admin.command('ping')
+        await _ping_database()
         
         return {
             "status": "healthy",
@@ -438,58 +633,64 @@ async def health_check():
 
 
 # Local background processing for debug mode (async to use server event loop)
-async def _process_video_async(video_id: str, video_path: str, caption_style_dict: dict) -> None:
+async def _process_video_async(
+    video_id: str,
+    video_path: str,
+    caption_style_dict: dict,
+    mark_processing: bool = True
+) -> None:
     try:
-        from app.services.video_processor import video_processor
-        from app.services.transcription import transcription_service
-        from app.models.schemas import CaptionStyle
-        from app.core.config import settings as _settings
-        from app.api.dependencies import database as _db
-        import os as _os
-        from datetime import datetime as _dt
-
-        collection = _db.get_collection("videos")
+        collection = database.get_collection("videos")
         if collection is None:
             return
 
-        await collection.update_one(
-            {"video_id": video_id},
-            {"$set": {"status": "processing", "updated_at": _dt.utcnow()}}
-        )
-
-        # Offload blocking work to thread pool
-        loop = asyncio.get_running_loop()
+        # Callers that already set the status skip this round trip
+        if mark_processing:
+            await collection.update_one(
+                {"video_id": video_id},
+                {"$set": {"status": "processing", "updated_at": datetime.utcnow()}}
+            )
 
-        audio_filename = f"{video_id}_audio.wav"
-        audio_path = _os.path.join(_settings.processed_dir, audio_filename)
-        await loop.run_in_executor(None, lambda: video_processor.extract_audio(video_path, audio_path))
+        # Whisper decodes the video's audio track through an ffmpeg pipe, so the
+        # intermediate WAV is only written when it should be kept
+        audio_path = None
+        if settings.persist_extracted_audio:
+            await progress_batcher.update_video_progress(collection, video_id, 10, "extracting_audio")
+            audio_filename = f"{video_id}_audio.wav"
+            audio_path = os.path.join(settings.processed_dir, audio_filename)
+            await video_processor.extract_audio(video_path, audio_path)
 
-        segments = await transcription_service.transcribe_audio(audio_path, video_id)
+        await progress_batcher.update_video_progress(collection, video_id, 30, "transcribing_audio")
+        segments = await transcription_service.transcribe_audio(audio_path or video_path, video_id)
 
+        await progress_batcher.update_video_progress(collection, video_id, 60, "creating_captions")
         output_filename = f"{video_id}_captioned.mp4"
-        output_path = _os.path.join(_settings.processed_dir, output_filename)
+        output_path = os.path.join(settings.processed_dir, output_filename)
         caption_style_obj = CaptionStyle(**caption_style_dict)
-        await loop.run_in_executor(None, lambda: video_processor.create_captioned_video(video_path, segments, caption_style_obj, output_path))
+        await video_processor.create_captioned_video(video_path, segments, caption_style_obj, output_path)
 
+        # Land any buffered progress before the final write so it can't overwrite it
+        await progress_batcher.flush()
         await collection.update_one(
             {"video_id": video_id},
             {"$set": {
                 "status": "completed",
-                "updated_at": _dt.utcnow(),
+                "updated_at": datetime.utcnow(),
+                "progress_percentage": 100,
+                "current_step": "completed",
                 "audio_path": audio_path,
                 "processed_path": output_path,
-                "transcription": [seg.dict() for seg in segments]
+                "transcription": [seg.model_dump() for seg in segments]
             }}
         )
     except Exception as e:
         try:
-            from datetime import datetime as _dt
-            from app.api.dependencies import database as _db
-            collection = _db.get_collection("videos")
+            await progress_batcher.flush()
+            collection = database.get_collection("videos")
             if collection is not None:
                 await collection.update_one(
                     {"video_id": video_id},
-                    {"$set": {"status": "failed", "error_message": str(e), "updated_at": _dt.utcnow()}}
+                    {"$set": {"status": "failed", "error_message": str(e), "updated_at": datetime.utcnow()}}
                 )
         except:
             pass
@@ -1,8 +1,13 @@
 """
 Authentication utilities for the Reely API
 """
+import asyncio
+import hashlib
 import logging
-from typing import Optional
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import firebase_admin
@@ -11,31 +16,76 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
-# Initialize Firebase Admin SDK
-try:
-    # If a credentials path is provided, use it; otherwise fall back to default
-    if getattr(settings, "firebase_credentials_path", None):
-        cred = credentials.Certificate(settings.firebase_credentials_path)
-        firebase_admin.initialize_app(cred)
-    else:
-        firebase_admin.initialize_app()
-except ValueError:
-    # Already initialized
-    pass
-
 security = HTTPBearer()
 
+# Firebase Admin SDK app, initialized on first token verification so that
+# importing this module (and forking workers after import) stays cheap
+_firebase_app: Optional[firebase_admin.App] = None
+_firebase_init_lock = threading.Lock()
+
+
+def _get_firebase_app() -> firebase_admin.App:
+    """Initialize the Firebase Admin SDK once and return the app handle"""
+    global _firebase_app
+    if _firebase_app is None:
+        with _firebase_init_lock:
+            if _firebase_app is None:
+                try:
+                    # If a credentials path is provided, use it; otherwise fall back to default
+                    if getattr(settings, "firebase_credentials_path", None):
+                        cred = credentials.Certificate(settings.firebase_credentials_path)
+                        _firebase_app = firebase_admin.initialize_app(cred)
+                    else:
+                        _firebase_app = firebase_admin.initialize_app()
+                except ValueError:
+                    # Already initialized
+                    _firebase_app = firebase_admin.get_app()
+    return _firebase_app
+
+
+def _verify_token_sync(token: str) -> dict:
+    """Blocking token verification, run on the auth executor"""
+    return firebase_auth.verify_id_token(token, app=_get_firebase_app())
+
+# Token verification may fetch Google's public keys and does RSA checks,
+# so it runs off the event loop
+_auth_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="firebase-auth")
+
+# Decoded tokens keyed by a digest of the raw token, valid until their exp claim
+TOKEN_CACHE_MAXSIZE = 4096
+_token_cache: Dict[bytes, dict] = {}
+
+
+def _token_cache_key(token: str) -> bytes:
+    """Digest used as cache key so raw tokens are not kept in memory"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
 
 async def verify_firebase_token(token: str) -> Optional[dict]:
     """
     Verify Firebase ID token and return user info
     """
+    cache_key = _token_cache_key(token)
+    cached = _token_cache.get(cache_key)
+    if cached is not None:
+        if cached.get("exp", 0) > time.time():
+            return cached
+        _token_cache.pop(cache_key, None)
+    
     try:
-        decoded_token = firebase_auth.verify_id_token(token)
-        return decoded_token
+        loop = asyncio.get_running_loop()
+        decoded_token = await loop.run_in_executor(
+            _auth_executor, _verify_token_sync, token
+        )
     except Exception as e:
         logger.error(f"Token verification failed: {e}")
         return None
+    
+    if len(_token_cache) >= TOKEN_CACHE_MAXSIZE:
+        # Evict the oldest entry (dicts keep insertion order)
+        _token_cache.pop(next(iter(_token_cache)))
+    _token_cache[cache_key] = decoded_token
+    return decoded_token
 
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
@@ -19,6 +19,12 @@ class Settings(BaseSettings):
     # Database Configuration
     mongodb_url: str = "mongodb://localhost:27017"
     database_name: str = "reely_db"
+    mongo_max_pool_size: int = 100
+    mongo_min_pool_size: int = 10
+    mongo_max_idle_time_ms: int = 60000
+    mongo_server_selection_timeout_ms: int = 3000
+    mongo_compressors: str = "zstd,zlib"  # wire compression, in order of preference
+    health_check_cache_ttl: float = 5.0  # seconds a successful database ping is reused
     
     # Redis Configuration
     redis_url: str = "redis://localhost:6379/0"
@@ -28,6 +34,8 @@ class Settings(BaseSettings):
     aws_secret_access_key: str = ""
     aws_region: str = "us-east-1"
     s3_bucket_name: str = "reely-videos"
+    s3_max_concurrency: int = 8  # parallel multipart parts per transfer
+    s3_multipart_chunksize_mb: int = 16
     
     # Application Settings
     secret_key: str = "your-secret-key-here"
@@ -37,19 +45,47 @@ class Settings(BaseSettings):
     # File Storage
     upload_dir: str = "./uploads"
     processed_dir: str = "./processed"
+    temp_dir: str = ""  # scratch files for ffmpeg; empty = /dev/shm if present, else $TMPDIR
     max_file_size_mb: int = 500
+    storage_io_threads: int = 4  # threads for local file writes, copies and deletes
+    # Internal nginx location serving stored files (e.g. "/protected"); empty streams from Python
+    accel_redirect_prefix: str = ""
     
     # Transcription Settings
     whisper_model: str = "base"
+    whisper_backend: str = "faster-whisper"  # faster-whisper (CTranslate2) or openai
+    whisper_compute_type: str = "auto"  # faster-whisper only; auto = int8_float16 on GPU, int8 on CPU
+    whisper_batch_size: int = 8  # faster-whisper only; speech chunks per encoder batch, 1 disables
+    whisper_cpu_threads: int = 0  # faster-whisper on CPU; 0 = one per core (divide by worker processes if several)
+    whisper_vad_min_silence_ms: int = 500  # silence that splits speech; silent stretches skip the encoder
+    whisper_quantize: bool = True  # openai backend only; dynamic int8 Linear layers on CPU
+    preload_whisper_model: bool = True  # load at worker start, only in workers consuming the transcription queue
     transcription_cache_ttl: int = 86400  # 24 hours
+    persist_extracted_audio: bool = False  # write a WAV alongside the video instead of decoding in memory (debugging)
     
     # Video Processing
     video_formats: List[str] = ["mp4", "avi", "mov", "mkv", "webm"]
     audio_formats: List[str] = ["mp3", "wav", "aac", "m4a"]
+    h264_encoder: str = "auto"  # auto picks a working NVENC/QSV/VideoToolbox encoder, else libx264
     
     # Celery Configuration
     celery_broker_url: str = "redis://localhost:6379/0"
     celery_result_backend: str = "redis://localhost:6379/0"
+    task_status_cache_ttl: float = 1.0  # seconds; absorbs status polling bursts
+    status_long_poll_timeout: float = 30.0  # seconds a ?wait=true status request may be held
+    # One long video job per worker process at a time, acknowledged only once done
+    celery_worker_prefetch_multiplier: int = 1
+    celery_task_acks_late: bool = True
+    celery_task_reject_on_worker_lost: bool = True
+    celery_worker_max_tasks_per_child: int = 0  # 0 = never recycle, so each process loads Whisper once
+    celery_worker_max_memory_per_child: int = 0  # KiB of resident memory before a process is replaced; 0 = no cap
+    celery_video_queue: str = "video_processing"
+    celery_transcription_queue: str = "transcription"  # Whisper stage; point GPU workers here with -Q
+    celery_light_queue: str = "light"  # tiny housekeeping tasks; run its worker with a high prefetch
+    # Soft time limits per pipeline stage in seconds; the hard limit follows 60s later
+    celery_extract_audio_time_limit: int = 300
+    celery_transcribe_time_limit: int = 1800
+    celery_caption_time_limit: int = 1500
     
     # Firebase Admin Credentials
     firebase_credentials_path: str = ""  # Path to service account JSON
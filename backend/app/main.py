@@ -3,7 +3,7 @@ Reely Backend - FastAPI Application Entry Point
 """
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import logging
 from app.api import routes
 from app.core.config import settings
@@ -20,7 +20,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Reely API",
     description="Automatic Video Captioning Service",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware configuration
@@ -59,7 +60,7 @@ async def shutdown_event():
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.error(f"Global exception: {str(exc)}", exc_info=True)
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
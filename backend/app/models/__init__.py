@@ -2,58 +2,40 @@
 Database models for MongoDB collections
 """
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field, ConfigDict
+from typing import Annotated, List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ConfigDict, BeforeValidator, PlainSerializer
 from bson import ObjectId
 
+from app.models.schemas import CaptionSegment, CaptionStyle, VideoMetadata
 
-class PyObjectId(ObjectId):
-    """Custom ObjectId type for Pydantic"""
-    @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
 
-    @classmethod
-    def validate(cls, v):
-        if not ObjectId.is_valid(v):
-            raise ValueError("Invalid objectid")
-        return ObjectId(v)
+def _ensure_object_id(value: Any) -> ObjectId:
+    """Coerce a string or ObjectId into an ObjectId"""
+    if isinstance(value, ObjectId):
+        return value
+    if not ObjectId.is_valid(value):
+        raise ValueError("Invalid objectid")
+    return ObjectId(value)
 
-    # Pydantic v2: schema modification via __modify_schema__ is not supported
 
+# ObjectId field type; stays an ObjectId for Mongo, serializes as str in JSON
+PyObjectId = Annotated[
+    ObjectId,
+    BeforeValidator(_ensure_object_id),
+    PlainSerializer(lambda value: str(value), return_type=str, when_used="json"),
+]
 
-class CaptionSegmentDB(BaseModel):
-    """Database model for caption segments"""
-    start_time: float
-    end_time: float
-    text: str
-    confidence: Optional[float] = None
 
-
-class CaptionStyleDB(BaseModel):
-    """Database model for caption styling"""
-    font_type: str = "Arial"
-    font_size: int = 24
-    font_color: str = "#FFFFFF"
-    stroke_color: str = "#000000"
-    stroke_width: int = 2
-    padding: int = 10
-    position: str = "bottom"
-
-
-class VideoMetadataDB(BaseModel):
-    """Database model for video metadata"""
-    duration: float
-    width: int
-    height: int
-    fps: float
-    format: str
-    size_bytes: int
+# The DB layer stores the same shapes the API exposes; sharing the classes means
+# pydantic builds one validator/serializer per shape instead of two
+CaptionSegmentDB = CaptionSegment
+CaptionStyleDB = CaptionStyle
+VideoMetadataDB = VideoMetadata
 
 
 class VideoDocument(BaseModel):
     """Main video document model for MongoDB"""
-    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    id: PyObjectId = Field(default_factory=ObjectId, alias="_id")
     video_id: str = Field(unique=True, index=True)
     filename: str
     status: str = "pending"  # pending, processing, completed, failed
@@ -87,13 +69,13 @@ class VideoDocument(BaseModel):
     model_config = ConfigDict(
         populate_by_name=True,
         arbitrary_types_allowed=True,
-        json_encoders={ObjectId: str},
+        defer_build=True,
     )
 
 
 class TranscriptionCache(BaseModel):
     """Cache model for transcription results"""
-    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    id: PyObjectId = Field(default_factory=ObjectId, alias="_id")
     video_hash: str = Field(unique=True, index=True)  # Hash of video content
     transcription: List[CaptionSegmentDB]
     model_used: str
@@ -103,13 +85,13 @@ class TranscriptionCache(BaseModel):
     model_config = ConfigDict(
         populate_by_name=True,
         arbitrary_types_allowed=True,
-        json_encoders={ObjectId: str},
+        defer_build=True,
     )
 
 
 class ProcessingTask(BaseModel):
     """Model for tracking processing tasks"""
-    id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
+    id: PyObjectId = Field(default_factory=ObjectId, alias="_id")
     video_id: str = Field(index=True)
     task_id: str = Field(unique=True, index=True)
     task_type: str  # upload, transcribe, caption, process
@@ -123,5 +105,5 @@ class ProcessingTask(BaseModel):
     model_config = ConfigDict(
         populate_by_name=True,
         arbitrary_types_allowed=True,
-        json_encoders={ObjectId: str},
+        defer_build=True,
     )
@@ -3,7 +3,7 @@ Pydantic schemas for API request/response models
 """
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from enum import Enum
 
 
@@ -24,12 +24,16 @@ class CaptionStyle(BaseModel):
     stroke_width: int = Field(default=2, ge=0, le=10, description="Stroke width in pixels")
     padding: int = Field(default=10, ge=0, le=50, description="Padding around text in pixels")
     position: str = Field(default="bottom", description="Caption position: top, bottom, center")
+    
+    model_config = ConfigDict(defer_build=True)
 
 
 class VideoUploadRequest(BaseModel):
     """Request model for video upload"""
     video_url: Optional[str] = Field(None, description="Public video URL to process")
     caption_style: Optional[CaptionStyle] = Field(default_factory=CaptionStyle, description="Caption styling options")
+    
+    model_config = ConfigDict(defer_build=True)
 
 
 class VideoUploadResponse(BaseModel):
@@ -38,6 +42,17 @@ class VideoUploadResponse(BaseModel):
     status: ProcessingStatus = Field(description="Current processing status")
     message: str = Field(description="Status message")
     created_at: datetime = Field(description="Upload timestamp")
+    
+    model_config = ConfigDict(defer_build=True)
+
+
+class CaptionWord(BaseModel):
+    """Word-level timing within a caption segment"""
+    word: str = Field(description="Word text")
+    start: float = Field(description="Start time in seconds")
+    end: float = Field(description="End time in seconds")
+    
+    model_config = ConfigDict(defer_build=True)
 
 
 class CaptionSegment(BaseModel):
@@ -46,6 +61,9 @@ class CaptionSegment(BaseModel):
     end_time: float = Field(description="End time in seconds")
     text: str = Field(description="Caption text")
     confidence: Optional[float] = Field(None, description="Transcription confidence score")
+    words: Optional[List[CaptionWord]] = Field(None, description="Word-level timestamps from the transcriber")
+    
+    model_config = ConfigDict(defer_build=True)
 
 
 class VideoMetadata(BaseModel):
@@ -56,6 +74,8 @@ class VideoMetadata(BaseModel):
     fps: float = Field(description="Frames per second")
     format: str = Field(description="Video format")
     size_bytes: int = Field(description="File size in bytes")
+    
+    model_config = ConfigDict(defer_build=True)
 
 
 class VideoInfo(BaseModel):
@@ -83,6 +103,8 @@ class VideoInfo(BaseModel):
     
     # Processing progress
     progress_percentage: int = Field(default=0, ge=0, le=100, description="Processing progress percentage")
+    
+    model_config = ConfigDict(defer_build=True)
 
 
 class VideoListResponse(BaseModel):
@@ -91,6 +113,10 @@ class VideoListResponse(BaseModel):
     total: int = Field(description="Total number of videos")
     page: int = Field(description="Current page number")
     page_size: int = Field(description="Number of videos per page")
+    next_after: Optional[datetime] = Field(None, description="Keyset cursor: created_at of the last video on this page")
+    next_after_id: Optional[str] = Field(None, description="Keyset cursor: video_id of the last video on this page")
+    
+    model_config = ConfigDict(defer_build=True)
 
 
 class CaptionRequest(BaseModel):
@@ -98,6 +124,8 @@ class CaptionRequest(BaseModel):
     video_id: str = Field(description="Video identifier")
     caption_style: Optional[CaptionStyle] = Field(default_factory=CaptionStyle, description="Caption styling options")
     regenerate: bool = Field(default=False, description="Whether to regenerate transcription")
+    
+    model_config = ConfigDict(defer_build=True)
 
 
 class ErrorResponse(BaseModel):
@@ -105,6 +133,8 @@ class ErrorResponse(BaseModel):
     error: str = Field(description="Error type")
     message: str = Field(description="Error message")
     details: Optional[Dict[str, Any]] = Field(None, description="Additional error details")
+    
+    model_config = ConfigDict(defer_build=True)
 
 
 class ProcessingProgress(BaseModel):
@@ -114,3 +144,5 @@ class ProcessingProgress(BaseModel):
     progress_percentage: int = Field(ge=0, le=100, description="Progress percentage")
     current_step: str = Field(description="Current processing step")
     estimated_time_remaining: Optional[int] = Field(None, description="Estimated time remaining in seconds")
+    
+    model_config = ConfigDict(defer_build=True)
@@ -7,10 +7,12 @@ from .storage import storage_service
 from .transcription import transcription_service
 from .caption_renderer import caption_renderer
 from .video_processor import video_processor
+from .progress import progress_batcher
 
 __all__ = [
     'storage_service',
     'transcription_service', 
     'caption_renderer',
-    'video_processor'
+    'video_processor',
+    'progress_batcher'
 ]
\ No newline at end of file
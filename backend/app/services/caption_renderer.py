@@ -2,8 +2,11 @@
 Caption rendering service for creating styled captions
 """
 import os
+import math
 import logging
-from typing import List, Tuple, Optional
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Tuple, Optional
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 from pathlib import Path
@@ -12,13 +15,70 @@ from app.models.schemas import CaptionSegment, CaptionStyle
 
 logger = logging.getLogger(__name__)
 
+# Loaded fonts kept per (font_type, size); font_type comes from requests, so bound it
+FONT_CACHE_SIZE = 64
+
+# Glyph coverage masks kept for reuse; captions repeat lines and words a lot
+MASK_CACHE_SIZE = 1024
+
+# Finished caption images; a caption stays on screen for many frames
+IMAGE_CACHE_SIZE = 512
+
+# Directories searched for named fonts
+FONT_DIRS = [
+    "/System/Library/Fonts/",  # macOS
+    "/usr/share/fonts/",  # Linux
+    "C:/Windows/Fonts/",  # Windows
+]
+FONT_EXTENSIONS = ('.ttf', '.otf')
+
+# Caption y offset per position setting, from (video_height, caption_height, padding)
+CAPTION_Y_POSITIONS = {
+    "top": lambda video_height, caption_height, padding: padding,
+    "center": lambda video_height, caption_height, padding: (video_height - caption_height) // 2,
+    "bottom": lambda video_height, caption_height, padding: video_height - caption_height - padding,
+}
+
+
+@lru_cache(maxsize=256)
+def _hex_to_rgb_cached(hex_color: str) -> Tuple[int, int, int]:
+    """Parse a hex color once; styles reuse a handful of colors for every caption"""
+    try:
+        # bytes.fromhex parses all three channels in one C call
+        rgb = bytes.fromhex(hex_color.lstrip('#')[:6])
+        if len(rgb) != 3:
+            raise ValueError("expected six hex digits")
+        return (rgb[0], rgb[1], rgb[2])
+    except Exception as e:
+        logger.warning(f"Error converting color {hex_color}: {e}")
+        return (255, 255, 255)  # Default to white
+
+
+@lru_cache(maxsize=8192)
+def _word_width(font: ImageFont.ImageFont, word: str) -> float:
+    """Measure a word once per font; the same words recur across a whole video"""
+    # Fonts hash by identity and the cache holds a reference, so ids can't be reused under it
+    return font.getlength(word)
+
+
+@lru_cache(maxsize=32)
+def _truetype_font(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
+    """Open and parse a font file once per (path, size) for every renderer in the process"""
+    return ImageFont.truetype(font_path, font_size)
+
 
 class CaptionRenderer:
     """Service for rendering captions with custom styling"""
     
     def __init__(self):
-        self.font_cache = {}
+        self.font_cache: "OrderedDict[Tuple[str, int], ImageFont.ImageFont]" = OrderedDict()
         self.default_fonts = self._get_default_fonts()
+        self._disc_rows_cache: Dict[int, Tuple[Tuple[int, int], ...]] = {}
+        self._mask_cache: "OrderedDict[Tuple[int, str], Tuple[np.ndarray, Tuple[int, int, int, int]]]" = OrderedDict()
+        self._image_cache: "OrderedDict[tuple, Tuple[Tuple[int, int], bytes]]" = OrderedDict()
+        self._font_index: Optional[List[Tuple[str, str]]] = None
+        # font_type -> resolved file, so each new size of a font skips the lookup
+        self._font_path_cache: "OrderedDict[str, Optional[str]]" = OrderedDict()
     
     def _get_default_fonts(self) -> List[str]:
         """Get list of available system fonts"""
@@ -48,17 +108,18 @@ class CaptionRenderer:
     
     def _load_font(self, font_type: str, font_size: int) -> ImageFont.ImageFont:
         """Load font with caching"""
-        cache_key = f"{font_type}_{font_size}"
-        
-        if cache_key in self.font_cache:
-            return self.font_cache[cache_key]
+        cache_key = (font_type, font_size)
+        font = self.font_cache.get(cache_key)
+        if font is not None:
+            self.font_cache.move_to_end(cache_key)
+            return font
         
         try:
             # Try to load custom font
             if font_type.lower() != "default" and font_type.lower() != "arial":
-                font_path = self._find_font_path(font_type)
+                font_path = self._resolve_font_path(font_type)
                 if font_path:
-                    font = ImageFont.truetype(font_path, font_size)
+                    font = _truetype_font(font_path, font_size)
                 else:
                     # Fallback to default
                     font = ImageFont.load_default()
@@ -66,34 +127,54 @@ class CaptionRenderer:
                 # Use system default font
                 font_path = self.default_fonts[0] if self.default_fonts[0] != "default" else None
                 if font_path:
-                    font = ImageFont.truetype(font_path, font_size)
+                    font = _truetype_font(font_path, font_size)
                 else:
                     font = ImageFont.load_default()
             
-            self.font_cache[cache_key] = font
-            return font
-            
         except Exception as e:
             logger.warning(f"Error loading font {font_type}: {e}, using default")
             font = ImageFont.load_default()
-            self.font_cache[cache_key] = font
-            return font
+        
+        self._store_font(cache_key, font)
+        return font
+    
+    def _store_font(self, cache_key: Tuple[str, int], font: ImageFont.ImageFont) -> None:
+        """Cache a loaded font, evicting the least recently used one past FONT_CACHE_SIZE"""
+        self.font_cache[cache_key] = font
+        if len(self.font_cache) <= FONT_CACHE_SIZE:
+            return
+        _, evicted = self.font_cache.popitem(last=False)
+        # Masks are keyed by font id, which a later font may reuse once this one is freed
+        evicted_id = id(evicted)
+        for mask_key in [key for key in self._mask_cache if key[0] == evicted_id]:
+            del self._mask_cache[mask_key]
+    
+    def _resolve_font_path(self, font_type: str) -> Optional[str]:
+        """Memoized _find_font_path, bounded like font_cache since font_type comes from requests"""
+        font_key = font_type.lower()
+        if font_key in self._font_path_cache:
+            self._font_path_cache.move_to_end(font_key)
+            return self._font_path_cache[font_key]
+        
+        font_path = self._find_font_path(font_type)
+        self._font_path_cache[font_key] = font_path
+        if len(self._font_path_cache) > FONT_CACHE_SIZE:
+            self._font_path_cache.popitem(last=False)
+        return font_path
     
     def _find_font_path(self, font_name: str) -> Optional[str]:
         """Find font file path by name"""
         try:
-            # Common font directories
-            font_dirs = [
-                "/System/Library/Fonts/",  # macOS
-                "/usr/share/fonts/",  # Linux
-                "C:/Windows/Fonts/",  # Windows
-            ]
+            name = font_name.lower()
+            font_index = self._get_font_index()
             
-            for font_dir in font_dirs:
-                if os.path.exists(font_dir):
-                    for file in os.listdir(font_dir):
-                        if font_name.lower() in file.lower() and file.endswith(('.ttf', '.otf')):
-                            return os.path.join(font_dir, file)
+            # Prefer an exact file-name match ("dejavusans" -> DejaVuSans.ttf), then any containing it
+            for stem, path in font_index:
+                if stem == name:
+                    return path
+            for stem, path in font_index:
+                if name in stem:
+                    return path
             
             return None
             
@@ -101,14 +182,37 @@ class CaptionRenderer:
             logger.warning(f"Error finding font {font_name}: {e}")
             return None
     
+    def _get_font_index(self) -> List[Tuple[str, str]]:
+        """(lowercased stem, path) for every font file, scanned once on first use"""
+        if self._font_index is None:
+            font_index: List[Tuple[str, str]] = []
+            for font_dir in FONT_DIRS:
+                self._scan_font_dir(font_dir, font_index)
+            self._font_index = font_index
+            logger.info(f"Indexed {len(font_index)} font files")
+        return self._font_index
+    
+    def _scan_font_dir(self, font_dir: str, font_index: List[Tuple[str, str]]) -> None:
+        """Add font files under font_dir to the index, files before subdirectories"""
+        try:
+            with os.scandir(font_dir) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError:
+            return
+        
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.name.lower().endswith(FONT_EXTENSIONS):
+                font_index.append((os.path.splitext(entry.name)[0].lower(), entry.path))
+        
+        for subdir in subdirs:
+            self._scan_font_dir(subdir, font_index)
+    
     def _hex_to_rgb(self, hex_color: str) -> Tuple[int, int, int]:
         """Convert hex color to RGB tuple"""
-        try:
-            hex_color = hex_color.lstrip('#')
-            return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
-        except Exception as e:
-            logger.warning(f"Error converting color {hex_color}: {e}")
-            return (255, 255, 255)  # Default to white
+        return _hex_to_rgb_cached(hex_color)
     
     def _wrap_text(self, text: str, font: ImageFont.ImageFont, max_width: int) -> List[str]:
         """Wrap text to fit within max_width"""
@@ -116,18 +220,24 @@ class CaptionRenderer:
             words = text.split()
             lines = []
             current_line = []
+            current_width = 0.0
+            
+            # Measure each word once and keep a running width, rather than
+            # re-measuring the whole candidate line for every word
+            space_width = _word_width(font, ' ')
             
             for word in words:
-                test_line = ' '.join(current_line + [word])
-                bbox = font.getbbox(test_line)
-                text_width = bbox[2] - bbox[0]
+                word_width = _word_width(font, word)
+                text_width = current_width + space_width + word_width if current_line else word_width
                 
                 if text_width <= max_width:
                     current_line.append(word)
+                    current_width = text_width
                 else:
                     if current_line:
                         lines.append(' '.join(current_line))
                         current_line = [word]
+                        current_width = word_width
                     else:
                         # Single word is too long, add it anyway
                         lines.append(word)
@@ -141,6 +251,147 @@ class CaptionRenderer:
             logger.error(f"Error wrapping text: {e}")
             return [text]
     
+    def _disc_rows(self, radius: int) -> Tuple[Tuple[int, int], ...]:
+        """(dy, half_width) horizontal runs making up a disc, cached per radius"""
+        rows = self._disc_rows_cache.get(radius)
+        if rows is None:
+            rows = tuple(
+                (dy, math.isqrt(radius*radius - dy*dy))
+                for dy in range(-radius, radius + 1)
+            )
+            self._disc_rows_cache[radius] = rows
+        return rows
+    
+    def _dilate_disc(self, mask: np.ndarray, radius: int) -> np.ndarray:
+        """Grey dilation of mask over a disc, padded by radius on every side.
+        
+        The disc is a stack of horizontal runs: the mask is widened one pixel at
+        a time for each run length, then each run is one shifted max. That is
+        O(radius) array passes instead of one per disc pixel.
+        """
+        height, width = mask.shape
+        
+        widened = np.zeros((height, width + 2*radius), dtype=np.uint8)
+        widened[:, radius:radius + width] = mask
+        by_half_width = [widened]
+        for _ in range(radius):
+            previous = by_half_width[-1]
+            current = previous.copy()
+            np.maximum(current[:, 1:], previous[:, :-1], out=current[:, 1:])
+            np.maximum(current[:, :-1], previous[:, 1:], out=current[:, :-1])
+            by_half_width.append(current)
+        
+        dilated = np.zeros((height + 2*radius, width + 2*radius), dtype=np.uint8)
+        for dy, half_width in self._disc_rows(radius):
+            region = dilated[radius + dy:radius + dy + height]
+            np.maximum(region, by_half_width[half_width], out=region)
+        return dilated
+    
+    def _glyph_mask(
+        self, text: str, font: ImageFont.ImageFont
+    ) -> Tuple[np.ndarray, Tuple[int, int, int, int]]:
+        """Rasterize text once to an 8-bit coverage mask.
+        
+        Returns the mask and the text's bbox; the mask origin is at the bbox's
+        (left, top) relative to the position the text would be drawn at.
+        """
+        cache_key = (id(font), text)
+        cached = self._mask_cache.get(cache_key)
+        if cached is not None:
+            self._mask_cache.move_to_end(cache_key)
+            return cached
+        
+        bbox = font.getbbox(text)
+        left, top, right, bottom = bbox
+        mask_img = Image.new('L', (max(right - left, 1), max(bottom - top, 1)), 0)
+        ImageDraw.Draw(mask_img).text((-left, -top), text, font=font, fill=255)
+        result = (np.asarray(mask_img), bbox)
+        
+        self._mask_cache[cache_key] = result
+        if len(self._mask_cache) > MASK_CACHE_SIZE:
+            self._mask_cache.popitem(last=False)
+        return result
+    
+    def _render_text_layer(
+        self,
+        text: str,
+        font: ImageFont.ImageFont,
+        fill_color: Tuple[int, int, int],
+        stroke_color: Tuple[int, int, int],
+        stroke_width: int
+    ) -> Tuple[Image.Image, int, int]:
+        """Render outlined text as an RGBA layer from a single rasterization.
+        
+        The outline is the glyph mask dilated over a disc of radius
+        stroke_width rather than one draw call per offset. Returns the layer and its (left, top) relative to the draw position.
+        """
+        mask, (left, top, _, _) = self._glyph_mask(text, font)
+        height, width = mask.shape
+        r = stroke_width
+        
+        text_alpha = np.zeros((height + 2*r, width + 2*r), dtype=np.uint8)
+        text_alpha[r:r + height, r:r + width] = mask
+        
+        if r > 0:
+            stroke_alpha = self._dilate_disc(mask, r)
+        else:
+            stroke_alpha = text_alpha
+        
+        # Composite text over stroke ("over" operator on straight alpha). Work in
+        # place on a few per-line buffers instead of a temporary per operation
+        a_text = text_alpha.astype(np.float32)
+        a_text /= 255.0
+        a_stroke = stroke_alpha.astype(np.float32)
+        a_stroke /= 255.0
+        a_stroke *= 1.0 - a_text
+        a_out = a_text + a_stroke
+        rgb = a_text[..., None] * np.asarray(fill_color, dtype=np.float32)
+        rgb += a_stroke[..., None] * np.asarray(stroke_color, dtype=np.float32)
+        rgb /= np.maximum(a_out, 1e-6)[..., None]
+        rgb += 0.5
+        a_out *= 255.0
+        a_out += 0.5
+        
+        layer = np.empty(text_alpha.shape + (4,), dtype=np.uint8)
+        layer[..., :3] = np.clip(rgb, 0, 255, out=rgb)
+        layer[..., 3] = np.clip(a_out, 0, 255, out=a_out)
+        return Image.fromarray(layer, 'RGBA'), left - r, top - r
+    
+    @staticmethod
+    def _paste_layer(canvas: Image.Image, layer: Image.Image, x: int, y: int) -> None:
+        """Alpha-composite layer onto canvas at (x, y), clipping at the canvas edges"""
+        source_x, source_y = max(0, -x), max(0, -y)
+        if source_x >= layer.width or source_y >= layer.height:
+            return
+        canvas.alpha_composite(layer, dest=(max(0, x), max(0, y)), source=(source_x, source_y))
+    
+    @staticmethod
+    def _style_key(style: CaptionStyle) -> tuple:
+        """Style fields that affect the rendered image (position only affects placement)"""
+        return (
+            style.font_type,
+            style.font_size,
+            style.font_color,
+            style.stroke_color,
+            style.stroke_width,
+            style.padding,
+        )
+    
+    def _get_cached_image(self, cache_key: tuple) -> Optional[Image.Image]:
+        """Return a fresh copy of a cached caption image, if present"""
+        cached = self._image_cache.get(cache_key)
+        if cached is None:
+            return None
+        self._image_cache.move_to_end(cache_key)
+        size, data = cached
+        return Image.frombytes('RGBA', size, data)
+    
+    def _store_cached_image(self, cache_key: tuple, image: Image.Image) -> None:
+        """Store raw RGBA bytes so callers never share PIL image state"""
+        self._image_cache[cache_key] = (image.size, image.tobytes())
+        if len(self._image_cache) > IMAGE_CACHE_SIZE:
+            self._image_cache.popitem(last=False)
+    
     def create_caption_image(
         self, 
         text: str, 
@@ -151,6 +402,11 @@ class CaptionRenderer:
     ) -> Image.Image:
         """Create caption image with specified styling"""
         try:
+            cache_key = ('caption', text, video_width, max_width_ratio, self._style_key(style))
+            cached = self._get_cached_image(cache_key)
+            if cached is not None:
+                return cached
+            
             # Calculate dimensions
             max_width = int(video_width * max_width_ratio)
             
@@ -166,7 +422,6 @@ class CaptionRenderer:
             
             # Create image
             caption_img = Image.new('RGBA', (video_width, total_height), (0, 0, 0, 0))
-            draw = ImageDraw.Draw(caption_img)
             
             # Convert colors
             font_color = self._hex_to_rgb(style.font_color)
@@ -175,32 +430,20 @@ class CaptionRenderer:
             # Draw text lines
             y_offset = style.padding
             for line in lines:
-                bbox = font.getbbox(line)
+                # Measured with the same (cached) rasterization the layer is drawn from
+                _, bbox = self._glyph_mask(line, font)
                 text_width = bbox[2] - bbox[0]
                 x_offset = (video_width - text_width) // 2
                 
-                # Draw stroke/outline
-                if style.stroke_width > 0:
-                    for dx in range(-style.stroke_width, style.stroke_width + 1):
-                        for dy in range(-style.stroke_width, style.stroke_width + 1):
-                            if dx*dx + dy*dy <= style.stroke_width*style.stroke_width:
-                                draw.text(
-                                    (x_offset + dx, y_offset + dy),
-                                    line,
-                                    font=font,
-                                    fill=stroke_color
-                                )
-                
-                # Draw main text
-                draw.text(
-                    (x_offset, y_offset),
-                    line,
-                    font=font,
-                    fill=font_color
+                # Draw text with stroke/outline
+                layer, left, top = self._render_text_layer(
+                    line, font, font_color, stroke_color, style.stroke_width
                 )
+                self._paste_layer(caption_img, layer, x_offset + left, y_offset + top)
                 
                 y_offset += line_height
             
+            self._store_cached_image(cache_key, caption_img)
             return caption_img
             
         except Exception as e:
@@ -218,6 +461,14 @@ class CaptionRenderer:
     ) -> Image.Image:
         """Create caption with word highlighting"""
         try:
+            cache_key = (
+                'highlight', text, current_word.lower(), highlight_color,
+                video_width, self._style_key(style)
+            )
+            cached = self._get_cached_image(cache_key)
+            if cached is not None:
+                return cached
+            
             # Calculate dimensions
             max_width = int(video_width * 0.8)
             
@@ -233,7 +484,6 @@ class CaptionRenderer:
             
             # Create image
             caption_img = Image.new('RGBA', (video_width, total_height), (0, 0, 0, 0))
-            draw = ImageDraw.Draw(caption_img)
             
             # Convert colors
             font_color = self._hex_to_rgb(style.font_color)
@@ -250,33 +500,20 @@ class CaptionRenderer:
                     # Determine color
                     word_color = highlight_rgb if word.lower() == current_word.lower() else font_color
                     
-                    # Draw stroke/outline
-                    if style.stroke_width > 0:
-                        stroke_col = stroke_color if word_color == font_color else font_color
-                        for dx in range(-style.stroke_width, style.stroke_width + 1):
-                            for dy in range(-style.stroke_width, style.stroke_width + 1):
-                                if dx*dx + dy*dy <= style.stroke_width*style.stroke_width:
-                                    draw.text(
-                                        (x_offset + dx, y_offset + dy),
-                                        word,
-                                        font=font,
-                                        fill=stroke_col
-                                    )
-                    
-                    # Draw main text
-                    draw.text(
-                        (x_offset, y_offset),
-                        word,
-                        font=font,
-                        fill=word_color
+                    # Draw text with stroke/outline
+                    stroke_col = stroke_color if word_color == font_color else font_color
+                    layer, left, top = self._render_text_layer(
+                        word, font, word_color, stroke_col, style.stroke_width
                     )
+                    self._paste_layer(caption_img, layer, x_offset + left, y_offset + top)
                     
                     # Move to next word position
-                    bbox = font.getbbox(word)
+                    _, bbox = self._glyph_mask(word, font)
                     x_offset += (bbox[2] - bbox[0]) + 4  # Add space between words
                 
                 y_offset += line_height
             
+            self._store_cached_image(cache_key, caption_img)
             return caption_img
             
         except Exception as e:
@@ -292,12 +529,9 @@ class CaptionRenderer:
     ) -> int:
         """Calculate Y position for caption based on position setting"""
         try:
-            if position.lower() == "top":
-                return padding
-            elif position.lower() == "center":
-                return (video_height - caption_height) // 2
-            else:  # bottom
-                return video_height - caption_height - padding
+            # Unknown positions fall back to bottom
+            y_position = CAPTION_Y_POSITIONS.get(position.lower(), CAPTION_Y_POSITIONS["bottom"])
+            return y_position(video_height, caption_height, padding)
                 
         except Exception as e:
             logger.warning(f"Error calculating position: {e}")
@@ -306,6 +540,9 @@ class CaptionRenderer:
     def cleanup_font_cache(self):
         """Clean up font cache"""
         self.font_cache.clear()
+        # Masks are keyed by font identity, so they go with the fonts
+        self._mask_cache.clear()
+        self._image_cache.clear()
 
 
 # Global caption renderer instance
@@ -0,0 +1,84 @@
+"""
+Progress tracking service that batches MongoDB progress writes
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+
+class ProgressBatcher:
+    """Coalesces progress updates and writes them with one bulk_write per collection"""
+
+    def __init__(self, max_pending: int = 100, flush_interval: float = 0.5):
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        # (collection id, filter field, filter value) -> fields to $set; newer ticks overwrite older ones
+        self._pending: Dict[Tuple[int, str, Any], Dict[str, Any]] = {}
+        self._collections: Dict[int, Any] = {}
+        self._lock = asyncio.Lock()
+        # Held through bulk_write, so a flush can't return while an earlier one is still writing
+        self._write_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def update(self, collection, key_field: str, key: Any, fields: Dict[str, Any]) -> None:
+        """Queue a $set for the document matching {key_field: key}"""
+        async with self._lock:
+            self._collections[id(collection)] = collection
+            pending = self._pending.setdefault((id(collection), key_field, key), {})
+            pending.update(fields)
+            pending["updated_at"] = datetime.utcnow()
+
+            flush_now = len(self._pending) >= self.max_pending
+            if not flush_now and self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush_later())
+
+        if flush_now:
+            await self.flush()
+
+    async def update_video_progress(self, collection, video_id: str, progress: int, step: str) -> None:
+        """Queue a progress tick for a video document"""
+        await self.update(
+            collection,
+            "video_id",
+            video_id,
+            {"progress_percentage": progress, "current_step": step}
+        )
+
+    async def flush(self) -> None:
+        """Write all pending updates now, after any write already in flight"""
+        async with self._write_lock:
+            async with self._lock:
+                pending, self._pending = self._pending, {}
+                collections, self._collections = self._collections, {}
+
+            if not pending:
+                return
+
+            operations: Dict[int, List[UpdateOne]] = {}
+            for (collection_id, key_field, key), fields in pending.items():
+                operations.setdefault(collection_id, []).append(
+                    UpdateOne({key_field: key}, {"$set": fields})
+                )
+
+            for collection_id, ops in operations.items():
+                try:
+                    await collections[collection_id].bulk_write(ops, ordered=False)
+                except Exception as e:
+                    # Progress is advisory; a lost tick must not fail processing
+                    logger.error(f"Error writing progress updates: {e}")
+
+    async def _flush_later(self) -> None:
+        """Flush once the batching window has passed"""
+        await asyncio.sleep(self.flush_interval)
+        # Clear first so updates arriving mid-flush schedule the next window
+        self._flush_task = None
+        await self.flush()
+
+
+# Global progress batcher instance
+progress_batcher = ProgressBatcher()
@@ -1,20 +1,51 @@
 """
 Storage service for handling file operations and cloud storage
 """
+import io
 import os
+import time
+import shutil
+import asyncio
 import hashlib
+import tempfile
 import aiofiles
+import aiofiles.os
 import httpx
-from typing import Optional, BinaryIO
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, BinaryIO, AsyncIterator, Tuple, Union
 from pathlib import Path
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
 from botocore.exceptions import ClientError
+from starlette.datastructures import UploadFile
 import logging
 
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Chunk size for file-to-file copies
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# Chunk size for writing URL downloads to disk
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Seconds a free-space reading is reused
+DISK_SPACE_CACHE_TTL = 1.0
+
+# What the save_* methods accept: raw bytes, a binary file object (or an
+# UploadFile), or an async iterator of chunks
+FileSource = Union[bytes, BinaryIO, UploadFile, AsyncIterator[bytes]]
+
+
+# Hex length of content hashes: 128 bits of the SHA-256 digest is ample to key caches
+# and keeps cache filenames short
+FILE_HASH_LENGTH = 32
+
+# Bytes sampled from each end of a file for its fingerprint
+FINGERPRINT_SAMPLE_SIZE = 64 * 1024
+
 
 class StorageService:
     """Service for handling file storage operations"""
@@ -23,6 +54,21 @@ class StorageService:
         self.upload_dir = Path(settings.upload_dir)
         self.processed_dir = Path(settings.processed_dir)
         self.s3_client = None
+        self._space_cache = (0.0, 0)  # (expires_at, free bytes)
+        # Local file I/O gets its own pool sized for the disk, instead of sharing the
+        # loop's default executor with everything else that calls to_thread
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.storage_io_threads,
+            thread_name_prefix="storage"
+        )
+        
+        # Multipart transfers with parallel parts for large videos
+        multipart_chunksize = settings.s3_multipart_chunksize_mb * 1024 * 1024
+        self.s3_transfer_config = TransferConfig(
+            multipart_threshold=multipart_chunksize,
+            multipart_chunksize=multipart_chunksize,
+            max_concurrency=settings.s3_max_concurrency
+        )
         
         # Initialize S3 client if AWS credentials are provided
         if settings.aws_access_key_id and settings.aws_secret_access_key:
@@ -30,15 +76,19 @@ class StorageService:
                 's3',
                 aws_access_key_id=settings.aws_access_key_id,
                 aws_secret_access_key=settings.aws_secret_access_key,
-                region_name=settings.aws_region
+                region_name=settings.aws_region,
+                # Enough pooled connections for every concurrent part, kept alive between transfers
+                config=BotoConfig(
+                    max_pool_connections=max(10, settings.s3_max_concurrency * 4),
+                    tcp_keepalive=True
+                )
             )
     
-    async def save_uploaded_file(self, file_content: bytes, filename: str) -> str:
-        """Save uploaded file to local storage"""
+    async def save_uploaded_file(self, source: FileSource, filename: str) -> str:
+        """Save an upload to local storage: bytes, a (spooled) file object or an async chunk iterator"""
+        file_path = self.upload_dir / filename
         try:
-            file_path = self.upload_dir / filename
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(file_content)
+            await self._write_source(source, file_path)
             
             logger.info(f"File saved locally: {file_path}")
             return str(file_path)
@@ -46,30 +96,81 @@ class StorageService:
             logger.error(f"Error saving uploaded file: {e}")
             raise
     
+    async def _write_source(self, source: FileSource, file_path: Path) -> None:
+        """Write bytes, a file object or an async chunk iterator to file_path.
+        
+        File objects are copied in one worker-thread hop and iterators chunk by
+        chunk, so neither is held in memory whole. A partial file is removed on
+        failure.
+        """
+        if isinstance(source, UploadFile):
+            source = source.file
+        try:
+            if isinstance(source, (bytes, bytearray, memoryview)):
+                async with aiofiles.open(file_path, 'wb', executor=self.executor) as f:
+                    await f.write(source)
+            elif hasattr(source, "read"):
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self._copy_fileobj, source, file_path
+                )
+            else:
+                async with aiofiles.open(file_path, 'wb', executor=self.executor) as f:
+                    async for chunk in source:
+                        await f.write(chunk)
+        except BaseException:
+            # Don't leave a truncated file behind
+            if file_path.exists():
+                file_path.unlink()
+            raise
+    
+    @staticmethod
+    def _copy_fileobj(src: BinaryIO, dest_path: Path) -> None:
+        """Copy src to dest_path, letting the kernel move the bytes when src is on disk"""
+        src.seek(0)
+        with open(dest_path, 'wb') as dst:
+            src_fd = _disk_fileno(src)
+            if src_fd is not None and hasattr(os, "sendfile"):
+                try:
+                    offset = 0
+                    while sent := os.sendfile(dst.fileno(), src_fd, offset, COPY_CHUNK_SIZE):
+                        offset += sent
+                    return
+                except OSError:
+                    # Filesystem doesn't support sendfile between files; copy in user space
+                    dst.seek(0)
+                    dst.truncate()
+                    src.seek(0)
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+    
     async def download_video_from_url(self, url: str, filename: str) -> str:
         """Download video from URL and save locally"""
+        file_path = self.upload_dir / filename
         try:
+            # Video is already compressed; asking for identity skips a pointless decode step
+            headers = {"Accept-Encoding": "identity"}
             async with httpx.AsyncClient() as client:
-                async with client.stream('GET', url) as response:
+                async with client.stream('GET', url, headers=headers) as response:
                     response.raise_for_status()
                     
-                    file_path = self.upload_dir / filename
-                    async with aiofiles.open(file_path, 'wb') as f:
-                        async for chunk in response.aiter_bytes():
+                    # Large chunks keep it to one thread-pool write per MB
+                    async with aiofiles.open(file_path, 'wb', executor=self.executor) as f:
+                        async for chunk in response.aiter_bytes(chunk_size=DOWNLOAD_CHUNK_SIZE):
                             await f.write(chunk)
             
             logger.info(f"Video downloaded from URL: {file_path}")
             return str(file_path)
         except Exception as e:
+            # Don't leave a truncated download behind
+            if file_path.exists():
+                file_path.unlink()
             logger.error(f"Error downloading video from URL: {e}")
             raise
     
-    async def save_processed_video(self, video_content: bytes, filename: str) -> str:
-        """Save processed video to local storage"""
+    async def save_processed_video(self, source: FileSource, filename: str) -> str:
+        """Save processed video to local storage, streaming it when it isn't already bytes"""
         try:
             file_path = self.processed_dir / filename
-            async with aiofiles.open(file_path, 'wb') as f:
-                await f.write(video_content)
+            await self._write_source(source, file_path)
             
             logger.info(f"Processed video saved: {file_path}")
             return str(file_path)
@@ -78,32 +179,91 @@ class StorageService:
             raise
     
     def get_file_hash(self, file_path: str) -> str:
-        """Calculate MD5 hash of file for caching purposes"""
+        """Calculate SHA-256 hash of file for caching purposes"""
+        return self.get_file_size_and_hash(file_path)[1]
+    
+    def get_file_size_and_hash(self, file_path: str) -> Tuple[int, str]:
+        """Size and get_file_hash digest of a file from one open and one read pass"""
         try:
-            hash_md5 = hashlib.md5()
+            # SHA-256 runs on SHA-NI via OpenSSL and outpaces a Python-driven MD5 loop
             with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
+                size = os.fstat(f.fileno()).st_size
+                if hasattr(hashlib, "file_digest"):
+                    digest = hashlib.file_digest(f, "sha256")
+                else:
+                    digest = hashlib.sha256()
+                    for chunk in iter(lambda: f.read(COPY_CHUNK_SIZE), b""):
+                        digest.update(chunk)
+            return size, digest.hexdigest()[:FILE_HASH_LENGTH]
         except Exception as e:
             logger.error(f"Error calculating file hash: {e}")
             raise
     
-    def get_file_size(self, file_path: str) -> int:
+    async def write_and_hash(self, chunks: AsyncIterator[bytes], file_path: str) -> Tuple[int, str]:
+        """Stream chunks to file_path, hashing them on the way instead of re-reading the file.
+        
+        Returns the byte count and the same digest get_file_hash gives for the written file.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        
+        async def hashed_chunks():
+            nonlocal size
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                yield chunk
+        
+        try:
+            await self._write_source(hashed_chunks(), Path(file_path))
+            return size, digest.hexdigest()[:FILE_HASH_LENGTH]
+        except Exception as e:
+            logger.error(f"Error writing and hashing file: {e}")
+            raise
+    
+    def get_file_fingerprint(self, file_path: str) -> str:
+        """Cheap content key from the file size plus its first and last bytes"""
+        try:
+            with open(file_path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                digest = hashlib.blake2b(str(size).encode(), digest_size=FILE_HASH_LENGTH // 2)
+                digest.update(f.read(FINGERPRINT_SAMPLE_SIZE))
+                if size > 2 * FINGERPRINT_SAMPLE_SIZE:
+                    f.seek(-FINGERPRINT_SAMPLE_SIZE, os.SEEK_END)
+                # Small files are hashed whole
+                digest.update(f.read(FINGERPRINT_SAMPLE_SIZE))
+            return digest.hexdigest()
+        except Exception as e:
+            logger.error(f"Error calculating file fingerprint: {e}")
+            raise
+    
+    async def get_file_size(self, file_path: str) -> int:
         """Get file size in bytes"""
         try:
-            return os.path.getsize(file_path)
+            return await aiofiles.os.path.getsize(file_path, executor=self.executor)
         except Exception as e:
             logger.error(f"Error getting file size: {e}")
             raise
     
-    def delete_file(self, file_path: str) -> bool:
+    async def delete_file(self, file_path: str) -> bool:
         """Delete file from local storage"""
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"File deleted: {file_path}")
-                return True
+            await aiofiles.os.remove(file_path, executor=self.executor)
+            logger.info(f"File deleted: {file_path}")
+            return True
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.error(f"Error deleting file: {e}")
+            return False
+    
+    def delete_file_sync(self, file_path: str) -> bool:
+        """Delete file from local storage, for callers outside an event loop"""
+        try:
+            os.remove(file_path)
+            logger.info(f"File deleted: {file_path}")
+            return True
+        except FileNotFoundError:
             return False
         except Exception as e:
             logger.error(f"Error deleting file: {e}")
@@ -116,7 +276,14 @@ class StorageService:
             return None
         
         try:
-            self.s3_client.upload_file(file_path, settings.s3_bucket_name, s3_key)
+            # boto3 transfers block, so run them off the event loop
+            await asyncio.to_thread(
+                self.s3_client.upload_file,
+                file_path,
+                settings.s3_bucket_name,
+                s3_key,
+                Config=self.s3_transfer_config
+            )
             s3_url = f"https://{settings.s3_bucket_name}.s3.{settings.aws_region}.amazonaws.com/{s3_key}"
             logger.info(f"File uploaded to S3: {s3_url}")
             return s3_url
@@ -130,7 +297,13 @@ class StorageService:
             raise ValueError("S3 client not initialized")
         
         try:
-            self.s3_client.download_file(settings.s3_bucket_name, s3_key, local_path)
+            await asyncio.to_thread(
+                self.s3_client.download_file,
+                settings.s3_bucket_name,
+                s3_key,
+                local_path,
+                Config=self.s3_transfer_config
+            )
             logger.info(f"File downloaded from S3: {local_path}")
             return local_path
         except ClientError as e:
@@ -156,13 +329,31 @@ class StorageService:
     
     def get_available_space(self) -> int:
         """Get available disk space in bytes"""
+        now = time.monotonic()
+        expires_at, free_bytes = self._space_cache
+        if now < expires_at:
+            return free_bytes
+        
         try:
-            statvfs = os.statvfs(self.upload_dir)
-            return statvfs.f_frsize * statvfs.f_bavail
+            # Same value as statvfs f_bavail * f_frsize, but also works on Windows
+            free_bytes = shutil.disk_usage(self.upload_dir).free
+            self._space_cache = (now + DISK_SPACE_CACHE_TTL, free_bytes)
+            return free_bytes
         except Exception as e:
             logger.error(f"Error getting available space: {e}")
             return 0
 
 
+def _disk_fileno(file_obj: BinaryIO) -> Optional[int]:
+    """Return the OS file descriptor backing file_obj, or None if it lives in memory"""
+    # fileno() would force an in-memory spooled file onto disk
+    if isinstance(file_obj, tempfile.SpooledTemporaryFile) and not file_obj._rolled:
+        return None
+    try:
+        return file_obj.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
 # Global storage service instance
 storage_service = StorageService()
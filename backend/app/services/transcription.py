@@ -2,10 +2,18 @@
 Transcription service using OpenAI Whisper for audio-to-text conversion
 """
 import os
+import time
+import wave
+import sqlite3
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import torch
 import whisper
 import logging
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
+from pydantic import TypeAdapter
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
@@ -16,26 +24,234 @@ from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+try:
+    from faster_whisper import BatchedInferencePipeline, WhisperModel
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+    import ctranslate2
+except ImportError:  # optional backend; fall back to openai-whisper
+    BatchedInferencePipeline = None
+    WhisperModel = None
+    VadOptions = None
+    get_speech_timestamps = None
+    ctranslate2 = None
+
+# ffmpeg decodes land in one int16 buffer sized for this much audio (30 s at 16 kHz),
+# doubled when a longer file fills it
+DECODE_BUFFER_SAMPLES = 30 * 16000
+
+# Validates/serializes a whole transcript in one pydantic-core pass instead of one model at a time
+caption_segments_adapter = TypeAdapter(List[CaptionSegment])
+
 
 class TranscriptionService:
     """Service for audio transcription using OpenAI Whisper"""
     
+    # Loaded models shared by every instance in the process: model name -> (model, backend, device)
+    _models: ClassVar[Dict[str, Tuple[Any, str, str]]] = {}
+    _models_lock: ClassVar[threading.Lock] = threading.Lock()
+    # One inference at a time, shared like the models: a model instance isn't safe to use from
+    # two threads and concurrent runs only contend for the same cores/GPU; batching happens
+    # inside a call. The thread starts on first submit.
+    executor: ClassVar[ThreadPoolExecutor] = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper")
+    
     def __init__(self):
         self.model = None
         self.model_name = settings.whisper_model
-        self.executor = ThreadPoolExecutor(max_workers=2)
+        self.backend = None  # resolved when the model loads
+        self.device = None
+        self._cache_db: Optional[sqlite3.Connection] = None
+        self._cache_lock = threading.Lock()
         # Defer model load to first use to keep imports fast and tests lightweight
     
+    def load_model(self):
+        """Load the Whisper model unless it is already loaded"""
+        if self.model is None:
+            self._load_model()
+    
     def _load_model(self):
         """Load Whisper model"""
         try:
-            logger.info(f"Loading Whisper model: {self.model_name}")
-            self.model = whisper.load_model(self.model_name)
+            self.model, self.backend, self.device = self._shared_model(self.model_name)
             logger.info("Whisper model loaded successfully")
         except Exception as e:
             logger.error(f"Error loading Whisper model: {e}")
             raise
     
+    def _shared_model(self, model_name: str) -> Tuple[Any, str, str]:
+        """Return the process-wide model for model_name, loading it on first use"""
+        with self._models_lock:
+            entry = self._models.get(model_name)
+            if entry is None:
+                model, backend = self._create_model(model_name)
+                entry = self._models[model_name] = (model, backend, self.device)
+        return entry
+    
+    def _create_model(self, model_name: str):
+        """Create a model on the configured backend; returns (model, backend)"""
+        if settings.whisper_backend == "faster-whisper" and WhisperModel is not None:
+            on_gpu = ctranslate2.get_cuda_device_count() > 0
+            compute_type = settings.whisper_compute_type
+            if compute_type == "auto":
+                compute_type = "int8_float16" if on_gpu else "int8"
+            logger.info(f"Loading faster-whisper model: {model_name} ({compute_type})")
+            self.device = "cuda" if on_gpu else "cpu"
+            model = WhisperModel(
+                model_name,
+                device=self.device,
+                compute_type=compute_type,
+                # CTranslate2 otherwise caps CPU inference at 4 threads
+                cpu_threads=settings.whisper_cpu_threads or os.cpu_count() or 0
+            )
+            if settings.whisper_batch_size > 1:
+                # Encodes the VAD speech chunks of a file in batches instead of one window at a time
+                model = BatchedInferencePipeline(model=model)
+            return model, "faster-whisper"
+        
+        if settings.whisper_backend == "faster-whisper":
+            logger.warning("faster-whisper is not installed, falling back to openai-whisper")
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        if self.device == "cuda":
+            # TF32 tensor cores for any fp32 matmuls left on Ampere+; no effect on older GPUs
+            torch.backends.cuda.matmul.allow_tf32 = True
+            torch.backends.cudnn.allow_tf32 = True
+        logger.info(f"Loading Whisper model: {model_name} on {self.device}")
+        model = whisper.load_model(model_name, device=self.device)
+        if settings.whisper_quantize:
+            model = self._quantize_model(model)
+        return model, "openai"
+    
+    def _quantize_model(self, model):
+        """Apply dynamic int8 quantization to a CPU openai-whisper model's Linear layers"""
+        if next(model.parameters()).is_cuda:
+            # quantize_dynamic only has CPU kernels
+            return model
+        
+        # whisper.model.Linear subclasses nn.Linear only to cast weights to the input dtype,
+        # which is a no-op on CPU; quantize_dynamic matches exact types, so unwrap it
+        for module in model.modules():
+            if type(module) is whisper.model.Linear:
+                module.__class__ = torch.nn.Linear
+        
+        logger.info("Applying dynamic int8 quantization to Whisper Linear layers")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    
+    def _run_model(self, audio_path: str) -> Dict[str, Any]:
+        """Transcribe with word timestamps, returning openai-whisper's result shape"""
+        self.load_model()
+        
+        if self.backend != "faster-whisper":
+            samples = self._load_audio(audio_path)
+            clips = self._speech_clips(samples)
+            if clips == []:
+                logger.info("No speech detected, skipping transcription")
+                return {"text": "", "segments": [], "language": None}
+            
+            # On CUDA, transcribe() computes the log-mel spectrogram on the audio tensor's device
+            audio = torch.from_numpy(samples).to(self.device)
+            return self.model.transcribe(
+                audio,
+                word_timestamps=True,
+                verbose=False,
+                fp16=self.device == "cuda",
+                # Only the voiced clips are encoded; timestamps stay on the original timeline
+                clip_timestamps=clips or "0"
+            )
+        
+        options = {}
+        if BatchedInferencePipeline is not None and isinstance(self.model, BatchedInferencePipeline):
+            options["batch_size"] = settings.whisper_batch_size
+        
+        # Greedy decoding, as openai-whisper's transcribe() does by default
+        segments, info = self.model.transcribe(
+            audio_path,
+            beam_size=1,
+            word_timestamps=True,
+            vad_filter=True,
+            vad_parameters={"min_silence_duration_ms": settings.whisper_vad_min_silence_ms},
+            **options
+        )
+        # The segments generator drives decoding; materialize it here in the worker thread
+        return {
+            "language": info.language,
+            "segments": [
+                {
+                    "start": segment.start,
+                    "end": segment.end,
+                    "text": segment.text,
+                    "avg_logprob": segment.avg_logprob,
+                    "words": [
+                        {"word": w.word, "start": w.start, "end": w.end, "probability": w.probability}
+                        for w in (segment.words or [])
+                    ],
+                }
+                for segment in segments
+            ],
+        }
+    
+    def _speech_clips(self, audio: np.ndarray) -> Optional[List[float]]:
+        """Flat [start, end, ...] seconds of voiced audio, or None when VAD is unavailable"""
+        if get_speech_timestamps is None:
+            return None
+        
+        # Silero VAD bundled with faster-whisper; works on the same 16 kHz samples
+        chunks = get_speech_timestamps(
+            audio,
+            VadOptions(min_silence_duration_ms=settings.whisper_vad_min_silence_ms)
+        )
+        sample_rate = whisper.audio.SAMPLE_RATE
+        return [bound / sample_rate for chunk in chunks for bound in (chunk["start"], chunk["end"])]
+    
+    def _load_audio(self, audio_path: str) -> np.ndarray:
+        """Load audio as 16 kHz mono float32, skipping ffmpeg for WAVs already in that format"""
+        try:
+            with wave.open(audio_path, "rb") as wav:
+                if (wav.getframerate() == whisper.audio.SAMPLE_RATE
+                        and wav.getnchannels() == 1 and wav.getsampwidth() == 2):
+                    pcm = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+                    return self._pcm_to_float(pcm)
+        except (wave.Error, EOFError):
+            pass  # not a plain PCM WAV; let ffmpeg decode it
+        return self._pcm_to_float(self._decode_audio(audio_path))
+    
+    @staticmethod
+    def _pcm_to_float(pcm: np.ndarray) -> np.ndarray:
+        """Scale int16 PCM to float32 in [-1, 1) with a single allocation"""
+        audio = pcm.astype(np.float32)
+        audio *= 1.0 / 32768.0
+        return audio
+    
+    def _decode_audio(self, audio_path: str) -> np.ndarray:
+        """Decode any ffmpeg-readable file to 16 kHz mono int16 PCM"""
+        command = [
+            "ffmpeg", "-nostdin", "-v", "error", "-threads", "0",
+            "-i", audio_path,
+            "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le",
+            "-ar", str(whisper.audio.SAMPLE_RATE), "-"
+        ]
+        buffer = np.empty(DECODE_BUFFER_SAMPLES, dtype=np.int16)
+        filled = 0  # bytes
+        # stderr goes to a file so a chatty decode can't fill its pipe and stall stdout
+        with tempfile.TemporaryFile() as stderr:
+            with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr) as process:
+                # Read straight into the array instead of collecting bytes chunks and joining them
+                view = memoryview(buffer).cast("B")
+                while True:
+                    if filled == len(view):
+                        grown = np.empty(len(buffer) * 2, dtype=np.int16)
+                        grown[:len(buffer)] = buffer
+                        buffer = grown
+                        view = memoryview(buffer).cast("B")
+                    read = process.stdout.readinto(view[filled:])
+                    if not read:
+                        break
+                    filled += read
+            
+            if process.returncode != 0:
+                stderr.seek(0)
+                message = stderr.read().decode(errors="replace").strip()
+                raise RuntimeError(f"Failed to load audio: {message}")
+        return buffer[:filled // 2]
+    
     async def transcribe_audio(self, audio_path: str, video_id: str) -> List[CaptionSegment]:
         """Transcribe audio file and return caption segments"""
         try:
@@ -71,31 +287,28 @@ class TranscriptionService:
     def _transcribe_audio_sync(self, audio_path: str) -> Dict[str, Any]:
         """Synchronous transcription method"""
         try:
-            if self.model is None:
-                self._load_model()
-            result = self.model.transcribe(
-                audio_path,
-                word_timestamps=True,
-                verbose=False
-            )
-            return result
+            return self._run_model(audio_path)
         except Exception as e:
             logger.error(f"Error in synchronous transcription: {e}")
             raise
     
     def _convert_to_segments(self, whisper_result: Dict[str, Any]) -> List[CaptionSegment]:
         """Convert Whisper result to caption segments"""
-        segments = []
-        
         try:
-            for segment in whisper_result.get("segments", []):
-                caption_segment = CaptionSegment(
-                    start_time=segment["start"],
-                    end_time=segment["end"],
-                    text=segment["text"].strip(),
-                    confidence=segment.get("avg_logprob", None)
-                )
-                segments.append(caption_segment)
+            segments = caption_segments_adapter.validate_python([
+                {
+                    "start_time": segment["start"],
+                    "end_time": segment["end"],
+                    "text": segment["text"].strip(),
+                    "confidence": segment.get("avg_logprob", None),
+                    "words": [
+                        {"word": text, "start": word["start"], "end": word["end"]}
+                        for word in segment.get("words", [])
+                        if (text := word["word"].strip())
+                    ] or None
+                }
+                for segment in whisper_result.get("segments", [])
+            ])
             
             logger.info(f"Converted {len(segments)} segments from transcription")
             return segments
@@ -104,34 +317,65 @@ class TranscriptionService:
             logger.error(f"Error converting segments: {e}")
             raise
     
+    def _cache_connection(self) -> sqlite3.Connection:
+        """Open the transcription cache database on first use"""
+        if self._cache_db is None:
+            cache_dir = Path(settings.processed_dir) / "cache"
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(cache_dir / "transcriptions.sqlite3", check_same_thread=False)
+            # WAL lets the API and Celery processes read while another writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS transcriptions ("
+                "cache_key TEXT PRIMARY KEY, model_used TEXT, created_at REAL, segments BLOB)"
+            )
+            self._cache_db = connection
+        return self._cache_db
+    
+    def _cache_key(self, audio_path: str) -> str:
+        """Cache key for a file under the current model"""
+        # Fingerprint rather than a full hash: the input is often the whole video
+        return f"{self.model_name}:{storage_service.get_file_fingerprint(audio_path)}"
+    
+    def _read_cache_sync(self, audio_path: str) -> Optional[List[CaptionSegment]]:
+        """Look up a cached transcription (runs in a worker thread)"""
+        cache_key = self._cache_key(audio_path)
+        with self._cache_lock:
+            connection = self._cache_connection()
+            row = connection.execute(
+                "SELECT created_at, segments FROM transcriptions WHERE cache_key = ?",
+                (cache_key,)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            created_at, payload = row
+            if time.time() - created_at >= settings.transcription_cache_ttl:
+                # Cache expired, remove row
+                with connection:
+                    connection.execute("DELETE FROM transcriptions WHERE cache_key = ?", (cache_key,))
+                return None
+        
+        logger.info(f"Found valid cached transcription: {cache_key}")
+        return caption_segments_adapter.validate_json(payload)
+    
+    def _write_cache_sync(self, audio_path: str, segments: List[CaptionSegment]) -> None:
+        """Store a transcription (runs in a worker thread)"""
+        cache_key = self._cache_key(audio_path)
+        payload = caption_segments_adapter.dump_json(segments)
+        with self._cache_lock:
+            connection = self._cache_connection()
+            with connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO transcriptions VALUES (?, ?, ?, ?)",
+                    (cache_key, self.model_name, time.time(), payload)
+                )
+        logger.info(f"Transcription cached: {cache_key}")
+    
     async def _get_cached_transcription(self, audio_path: str) -> Optional[List[CaptionSegment]]:
         """Check if transcription is cached"""
         try:
-            file_hash = storage_service.get_file_hash(audio_path)
-            
-            # In a real implementation, you would query MongoDB here
-            # For now, we'll implement a simple file-based cache
-            cache_dir = Path(settings.processed_dir) / "cache"
-            cache_dir.mkdir(exist_ok=True)
-            
-            cache_file = cache_dir / f"{file_hash}.json"
-            
-            if cache_file.exists():
-                import json
-                with open(cache_file, 'r') as f:
-                    cached_data = json.load(f)
-                
-                # Check if cache is still valid
-                cache_time = datetime.fromisoformat(cached_data["created_at"])
-                if datetime.now() - cache_time < timedelta(seconds=settings.transcription_cache_ttl):
-                    logger.info(f"Found valid cached transcription: {cache_file}")
-                    return [CaptionSegment(**seg) for seg in cached_data["segments"]]
-                else:
-                    # Cache expired, remove file
-                    cache_file.unlink()
-            
-            return None
-            
+            return await asyncio.to_thread(self._read_cache_sync, audio_path)
         except Exception as e:
             logger.error(f"Error checking cache: {e}")
             return None
@@ -139,26 +383,7 @@ class TranscriptionService:
     async def _cache_transcription(self, audio_path: str, segments: List[CaptionSegment]) -> None:
         """Cache transcription result"""
         try:
-            file_hash = storage_service.get_file_hash(audio_path)
-            
-            cache_dir = Path(settings.processed_dir) / "cache"
-            cache_dir.mkdir(exist_ok=True)
-            
-            cache_file = cache_dir / f"{file_hash}.json"
-            
-            cache_data = {
-                "file_hash": file_hash,
-                "model_used": self.model_name,
-                "created_at": datetime.now().isoformat(),
-                "segments": [seg.dict() for seg in segments]
-            }
-            
-            import json
-            with open(cache_file, 'w') as f:
-                json.dump(cache_data, f, indent=2)
-            
-            logger.info(f"Transcription cached: {cache_file}")
-            
+            await asyncio.to_thread(self._write_cache_sync, audio_path, segments)
         except Exception as e:
             logger.error(f"Error caching transcription: {e}")
     
@@ -173,8 +398,13 @@ class TranscriptionService:
                 raise ValueError(f"Model {model_name} not available")
             
             logger.info(f"Changing Whisper model to: {model_name}")
-            self.model = whisper.load_model(model_name)
+            previous_name = self.model_name
+            self.model, self.backend, self.device = self._shared_model(model_name)
             self.model_name = model_name
+            if previous_name != model_name:
+                # Don't keep the old weights resident for instances that never load them again
+                with self._models_lock:
+                    self._models.pop(previous_name, None)
             logger.info("Model changed successfully")
             
         except Exception as e:
@@ -185,6 +415,8 @@ class TranscriptionService:
         """Get information about current model"""
         return {
             "model_name": self.model_name,
+            "backend": self.backend or settings.whisper_backend,
+            "device": self.device,
             "available_models": whisper.available_models(),
             "model_size": whisper._MODELS[self.model_name] if self.model_name in whisper._MODELS else "unknown"
         }
@@ -222,20 +454,13 @@ class TranscriptionService:
     def _transcribe_with_word_timestamps(self, audio_path: str) -> Dict[str, Any]:
         """Transcribe with word-level timestamps"""
         try:
-            if self.model is None:
-                self._load_model()
-            result = self.model.transcribe(
-                audio_path,
-                word_timestamps=True,
-                verbose=False
-            )
-            return result
+            return self._run_model(audio_path)
         except Exception as e:
             logger.error(f"Error in word-level transcription: {e}")
             raise
     
     def cleanup(self):
-        """Cleanup resources"""
+        """Shut down the shared inference thread; for process exit, it serves every instance"""
         if self.executor:
             self.executor.shutdown(wait=True)
 
@@ -2,40 +2,152 @@
 Video processing service for audio extraction and caption overlay
 """
 import os
+import json
+import asyncio
 import logging
-from typing import List, Optional, Tuple
+import subprocess
+import uuid
+from fractions import Fraction
+from typing import Dict, List, NamedTuple, Optional, Tuple
 from pathlib import Path
-"""Lazy import of heavy video libraries to avoid import-time failures in test envs"""
 import tempfile
 
 from app.core.config import settings
 from app.models.schemas import CaptionSegment, CaptionStyle
-from app.services.caption_renderer import caption_renderer
+from app.services.caption_renderer import CAPTION_Y_POSITIONS, _hex_to_rgb_cached
 from app.services.storage import storage_service
 
 logger = logging.getLogger(__name__)
 
 
+FFMPEG_BINARY = "ffmpeg"
+FFPROBE_BINARY = "ffprobe"
+DEFAULT_HIGHLIGHT_COLOR = "#FFFF00"
+
+# Hardware H.264 encoders in order of preference; libx264 is the fallback
+HARDWARE_H264_ENCODERS = ("h264_nvenc", "h264_qsv", "h264_videotoolbox")
+
+# Speed-oriented presets per encoder
+H264_ENCODER_OPTIONS = {
+    "libx264": ["-preset", "veryfast"],
+    "h264_nvenc": ["-preset", "p4"],
+    "h264_qsv": ["-preset", "veryfast"],
+}
+
+# Audio codecs an MP4 output can carry as-is; anything else is re-encoded to AAC
+COPYABLE_AUDIO_CODECS = ("aac", "mp3", "opus")
+
+# Probed files remembered per process; keyed by path, mtime and size so edits re-probe
+METADATA_CACHE_MAXSIZE = 128
+
+# Target video bitrates for compress_video/process_video quality levels
+QUALITY_SETTINGS = {
+    "low": {"bitrate": "500k", "crf": 28},
+    "medium": {"bitrate": "1000k", "crf": 23},
+    "high": {"bitrate": "2000k", "crf": 18}
+}
+
+
+class WordTiming(NamedTuple):
+    """One word's karaoke timing; duration_cs is its ASS \\k length in centiseconds"""
+    word: str
+    start: float
+    end: float
+    duration_cs: int
+
+
 class VideoProcessor:
     """Service for video processing operations"""
     
     def __init__(self):
-        self.temp_dir = Path(tempfile.gettempdir()) / "reely_processing"
-        self.temp_dir.mkdir(exist_ok=True)
+        self.temp_dir = self._temp_root() / "reely_processing"
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        self._h264_encoder: Optional[str] = None
+        self._metadata_cache: Dict[Tuple[str, int, int], dict] = {}
+    
+    @staticmethod
+    def _temp_root() -> Path:
+        """Scratch root: the configured dir, else RAM-backed /dev/shm, else the system temp dir"""
+        if settings.temp_dir:
+            return Path(settings.temp_dir)
+        # Keeps scratch files off slow or network-mounted disks
+        if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+            return Path("/dev/shm")
+        return Path(tempfile.gettempdir())
+    
+    async def _run_ffmpeg(self, binary: str, args: List[str], cwd: Optional[Path] = None) -> subprocess.CompletedProcess:
+        """Run an ffmpeg/ffprobe command, raising with its stderr on failure"""
+        command = [binary, "-v", "error", *args]
+        # Awaiting the child holds no thread; ffmpeg does its own threading
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd
+        )
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            # Don't leave an orphaned encode running
+            process.kill()
+            await process.wait()
+            raise
+        
+        result = subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+        if result.returncode != 0:
+            stderr = result.stderr.decode(errors="replace").strip()
+            raise RuntimeError(f"{binary} exited with code {result.returncode}: {stderr}")
+        return result
+    
+    async def get_h264_encoder(self) -> str:
+        """H.264 encoder to use, detected once per process"""
+        if self._h264_encoder is None:
+            if settings.h264_encoder != "auto":
+                self._h264_encoder = settings.h264_encoder
+            else:
+                self._h264_encoder = await self._detect_h264_encoder()
+            logger.info(f"Using H.264 encoder: {self._h264_encoder}")
+        return self._h264_encoder
+    
+    async def _detect_h264_encoder(self) -> str:
+        """Pick the first hardware encoder this ffmpeg build lists and can actually open"""
+        try:
+            listing = (await self._run_ffmpeg(FFMPEG_BINARY, ["-hide_banner", "-encoders"])).stdout.decode()
+        except Exception as e:
+            logger.warning(f"Could not list ffmpeg encoders: {e}")
+            return "libx264"
+        
+        for encoder in HARDWARE_H264_ENCODERS:
+            if encoder not in listing:
+                continue
+            # Builds list encoders whose hardware isn't present; encode one frame to be sure
+            try:
+                await self._run_ffmpeg(FFMPEG_BINARY, [
+                    "-f", "lavfi", "-i", "color=size=256x256:duration=0.1",
+                    "-frames:v", "1", "-c:v", encoder, "-f", "null", "-"
+                ])
+                return encoder
+            except RuntimeError:
+                logger.info(f"H.264 encoder {encoder} is listed but unusable")
+        return "libx264"
     
-    def extract_audio(self, video_path: str, output_path: str) -> str:
+    async def extract_audio(self, video_path: str, output_path: str) -> str:
         """Extract audio from video file"""
         try:
-            from moviepy.editor import VideoFileClip
             logger.info(f"Extracting audio from {video_path}")
             
-            with VideoFileClip(video_path) as video:
-                audio = video.audio
-                if audio is None:
+            # Demux the audio track only and resample straight to Whisper's 16 kHz mono input
+            try:
+                await self._run_ffmpeg(FFMPEG_BINARY, [
+                    "-y", "-i", video_path,
+                    "-map", "0:a:0", "-vn",
+                    "-ac", "1", "-ar", "16000", "-f", "wav",
+                    output_path
+                ])
+            except RuntimeError as e:
+                if "matches no streams" in str(e):
                     raise ValueError("No audio track found in video")
-                
-                audio.write_audiofile(output_path, verbose=False, logger=None)
-                audio.close()
+                raise
             
             logger.info(f"Audio extracted to {output_path}")
             return output_path
@@ -44,28 +156,55 @@ class VideoProcessor:
             logger.error(f"Error extracting audio: {e}")
             raise
     
-    def get_video_metadata(self, video_path: str) -> dict:
+    async def get_video_metadata(self, video_path: str) -> dict:
         """Get video metadata information"""
         try:
-            from moviepy.editor import VideoFileClip
-            with VideoFileClip(video_path) as video:
-                metadata = {
-                    "duration": video.duration,
-                    "width": video.w,
-                    "height": video.h,
-                    "fps": video.fps,
-                    "format": Path(video_path).suffix.lower(),
-                    "size_bytes": os.path.getsize(video_path)
-                }
+            # One stat serves as both the cache key and size_bytes
+            stat = await asyncio.to_thread(os.stat, video_path)
+            cache_key = (video_path, stat.st_mtime_ns, stat.st_size)
+            cached = self._metadata_cache.get(cache_key)
+            if cached is not None:
+                return dict(cached)
+            
+            result = await self._run_ffmpeg(FFPROBE_BINARY, [
+                "-print_format", "json",
+                "-show_streams", "-show_format",
+                video_path
+            ])
+            probe = json.loads(result.stdout)
+            video = next(
+                (stream for stream in probe.get("streams", []) if stream.get("codec_type") == "video"),
+                None
+            )
+            if video is None:
+                raise ValueError("No video stream found in file")
+            audio = next(
+                (stream for stream in probe.get("streams", []) if stream.get("codec_type") == "audio"),
+                None
+            )
+            
+            frame_rate = video.get("avg_frame_rate", "0/0")
+            metadata = {
+                "duration": float(probe["format"]["duration"]),
+                "width": video["width"],
+                "height": video["height"],
+                "fps": float(Fraction(frame_rate)) if not frame_rate.endswith("/0") else None,
+                "format": Path(video_path).suffix.lower(),
+                "size_bytes": stat.st_size,
+                "audio_codec": audio.get("codec_name") if audio else None
+            }
             
             logger.info(f"Video metadata extracted: {metadata}")
-            return metadata
+            if len(self._metadata_cache) >= METADATA_CACHE_MAXSIZE:
+                self._metadata_cache.pop(next(iter(self._metadata_cache)))
+            self._metadata_cache[cache_key] = metadata
+            return dict(metadata)
             
         except Exception as e:
             logger.error(f"Error getting video metadata: {e}")
             raise
     
-    def create_captioned_video(
+    async def create_captioned_video(
         self,
         video_path: str,
         caption_segments: List[CaptionSegment],
@@ -73,173 +212,240 @@ class VideoProcessor:
         output_path: str
     ) -> str:
         """Create video with captions overlaid"""
+        logger.info(f"Creating captioned video: {output_path}")
+        return await self.process_video(
+            video_path,
+            output_path,
+            caption_segments=caption_segments,
+            caption_style=caption_style
+        )
+    
+    async def process_video(
+        self,
+        video_path: str,
+        output_path: str,
+        max_width: Optional[int] = None,
+        quality: Optional[str] = None,
+        caption_segments: Optional[List[CaptionSegment]] = None,
+        caption_style: Optional[CaptionStyle] = None,
+        highlight_color: Optional[str] = None
+    ) -> str:
+        """Resize, compress and caption a video in a single ffmpeg decode/encode"""
         try:
-            from moviepy.editor import VideoFileClip, CompositeVideoClip, ImageClip
-            logger.info(f"Creating captioned video: {output_path}")
+            metadata = await self.get_video_metadata(video_path)
+            width, height = metadata["width"], metadata["height"]
             
-            with VideoFileClip(video_path) as video:
-                # Get video dimensions
-                video_width, video_height = video.size
-                
-                # Create caption clips
-                caption_clips = []
-                
-                for segment in caption_segments:
-                    # Create caption image
-                    caption_img = caption_renderer.create_caption_image(
-                        segment.text,
-                        video_width,
-                        video_height,
-                        caption_style
-                    )
-                    
-                    # Save caption image temporarily
-                    temp_img_path = self.temp_dir / f"caption_{segment.start_time}.png"
-                    caption_img.save(temp_img_path)
-                    
-                    # Create text clip
-                    caption_clip = ImageClip(str(temp_img_path), duration=segment.end_time - segment.start_time)
-                    caption_clip = caption_clip.set_start(segment.start_time)
-                    
-                    # Position caption
-                    y_position = self._calculate_caption_position(
-                        video_height,
-                        caption_img.height,
-                        caption_style.position,
-                        caption_style.padding
-                    )
-                    caption_clip = caption_clip.set_position(('center', y_position))
-                    
-                    caption_clips.append(caption_clip)
-                
-                # Composite video with captions
-                final_video = CompositeVideoClip([video] + caption_clips)
-                
-                # Write final video
-                final_video.write_videofile(
-                    output_path,
-                    codec='libx264',
-                    audio_codec='aac',
-                    verbose=False,
-                    logger=None
-                )
-                
-                # Clean up
-                final_video.close()
-                for clip in caption_clips:
-                    clip.close()
+            filters = []
+            if max_width and width > max_width:
+                # Keep the aspect ratio; libx264 needs even dimensions
+                height = int(height * max_width / width) // 2 * 2
+                width = max_width
+                filters.append(f"scale={width}:{height}")
+            
+            ass_path = None
+            if caption_segments is not None:
+                style = caption_style or CaptionStyle()
+                # Laid out against the output frame, i.e. after any scaling
+                if highlight_color:
+                    subtitles = self._segments_to_karaoke_ass(caption_segments, style, width, height, highlight_color)
+                else:
+                    subtitles = self._segments_to_ass(caption_segments, style, width, height)
+                # A hex name needs no filtergraph escaping; ffmpeg runs from the temp dir to find it
+                ass_path = self.temp_dir / f"{uuid.uuid4().hex}.ass"
+                ass_path.write_text(subtitles, encoding="utf-8")
+                filters.append(f"ass={ass_path.name}")
+            
+            args = ["-y", "-i", os.path.abspath(video_path)]
+            if filters or quality:
+                encoder = await self.get_h264_encoder()
+                args += ["-vf", self._build_filtergraph(filters), "-c:v", encoder]
+                args += H264_ENCODER_OPTIONS.get(encoder, [])
+                if quality:
+                    args += ["-b:v", QUALITY_SETTINGS.get(quality, QUALITY_SETTINGS["medium"])["bitrate"]]
+            else:
+                # Nothing changes the picture, so don't re-encode it
+                args += ["-c:v", "copy"]
+            
+            # Nothing here touches the audio, so copy it unless the codec can't go into MP4
+            audio_codec = "copy" if metadata.get("audio_codec") in COPYABLE_AUDIO_CODECS else "aac"
+            args += ["-c:a", audio_codec, os.path.abspath(output_path)]
             
-            logger.info(f"Captioned video created: {output_path}")
+            try:
+                await self._run_ffmpeg(FFMPEG_BINARY, args, cwd=self.temp_dir)
+            finally:
+                if ass_path is not None:
+                    ass_path.unlink(missing_ok=True)
+            
+            logger.info(f"Video processed: {output_path}")
             return output_path
             
         except Exception as e:
-            logger.error(f"Error creating captioned video: {e}")
+            logger.error(f"Error processing video: {e}")
             raise
     
-    def create_word_highlighted_video(
+    def _build_filtergraph(self, filters: List[str]) -> str:
+        """Chain video filters, ending in the 4:2:0 pixel format players expect"""
+        return ",".join(filters + ["format=yuv420p"])
+    
+    def _segments_to_ass(
+        self,
+        segments: List[CaptionSegment],
+        style: CaptionStyle,
+        video_width: int,
+        video_height: int
+    ) -> str:
+        """Build an ASS subtitle script with one Dialogue line per segment"""
+        events = [
+            f"Dialogue: 0,{self._ass_timestamp(segment.start_time)},{self._ass_timestamp(segment.end_time)},"
+            f"Default,,0,0,0,,{self._ass_escape(segment.text.strip())}"
+            for segment in segments
+        ]
+        return self._ass_header(style, video_width, video_height) + "\n".join(events) + "\n"
+    
+    def _ass_header(
+        self,
+        style: CaptionStyle,
+        video_width: int,
+        video_height: int,
+        highlight_color: Optional[str] = None
+    ) -> str:
+        """ASS script info and the Default style derived from a CaptionStyle"""
+        # Numpad alignment, horizontally centred like the PIL renderer
+        alignment = {"top": 8, "center": 5}.get(style.position.lower(), 2)
+        # Same 80% text width the PIL renderer wraps to
+        side_margin = video_width // 10
+        # Karaoke fills from SecondaryColour (not yet spoken) to PrimaryColour (spoken)
+        secondary = self._ass_color(style.font_color)
+        primary = self._ass_color(highlight_color) if highlight_color else secondary
+        return (
+            "[Script Info]\n"
+            "ScriptType: v4.00+\n"
+            # Script coordinates equal the frame size, so sizes and margins are in video pixels
+            f"PlayResX: {video_width}\n"
+            f"PlayResY: {video_height}\n"
+            "WrapStyle: 0\n"
+            "ScaledBorderAndShadow: yes\n"
+            "\n"
+            "[V4+ Styles]\n"
+            "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+            "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, "
+            "Shadow, Alignment, MarginL, MarginR, MarginV, Encoding\n"
+            f"Style: Default,{self._ass_font_name(style.font_type)},{style.font_size},{primary},{secondary},"
+            f"{self._ass_color(style.stroke_color)},&H00000000,0,0,0,0,100,100,0,0,1,"
+            f"{style.stroke_width},0,{alignment},{side_margin},{side_margin},{style.padding},1\n"
+            "\n"
+            "[Events]\n"
+            "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+        )
+    
+    def _ass_color(self, hex_color: str) -> str:
+        """Convert #RRGGBB to ASS &HAABBGGRR (opaque)"""
+        red, green, blue = _hex_to_rgb_cached(hex_color)
+        return f"&H00{blue:02X}{green:02X}{red:02X}"
+    
+    def _ass_font_name(self, font_type: str) -> str:
+        """Font name safe to place in a comma-separated ASS Style line"""
+        # A comma would shift every later Style field; a newline would start a new script line
+        name = "".join(char for char in font_type if char != "," and char.isprintable()).strip()
+        return name or CaptionStyle.model_fields["font_type"].default
+    
+    def _ass_timestamp(self, seconds: float) -> str:
+        """Format seconds as ASS h:mm:ss.cc"""
+        centiseconds = max(0, round(seconds * 100))
+        hours, centiseconds = divmod(centiseconds, 360000)
+        minutes, centiseconds = divmod(centiseconds, 6000)
+        secs, centiseconds = divmod(centiseconds, 100)
+        return f"{hours}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+    
+    def _ass_escape(self, text: str) -> str:
+        """Escape text so libass renders it literally"""
+        for char in ("\\", "{", "}"):
+            text = text.replace(char, "\\" + char)
+        return text.replace("\n", "\\N")
+    
+    async def create_word_highlighted_video(
         self,
         video_path: str,
         caption_segments: List[CaptionSegment],
         caption_style: CaptionStyle,
-        output_path: str
+        output_path: str,
+        highlight_color: str = DEFAULT_HIGHLIGHT_COLOR
     ) -> str:
         """Create video with word-level highlighting"""
-        try:
-            from moviepy.editor import VideoFileClip, CompositeVideoClip, ImageClip
-            logger.info(f"Creating word-highlighted video: {output_path}")
-            
-            with VideoFileClip(video_path) as video:
-                video_width, video_height = video.size
-                caption_clips = []
-                
-                for segment in caption_segments:
-                    # Split segment into words with timing
-                    word_timings = self._split_segment_into_words(segment)
-                    
-                    for word_timing in word_timings:
-                        # Create highlighted caption
-                        caption_img = caption_renderer.create_word_highlighted_caption(
-                            segment.text,
-                            word_timing["word"],
-                            video_width,
-                            video_height,
-                            caption_style
-                        )
-                        
-                        # Save caption image
-                        temp_img_path = self.temp_dir / f"highlight_{word_timing['start']}.png"
-                        caption_img.save(temp_img_path)
-                        
-                        # Create clip
-                        caption_clip = ImageClip(
-                            str(temp_img_path),
-                            duration=word_timing["end"] - word_timing["start"]
-                        )
-                        caption_clip = caption_clip.set_start(word_timing["start"])
-                        
-                        # Position caption
-                        y_position = self._calculate_caption_position(
-                            video_height,
-                            caption_img.height,
-                            caption_style.position,
-                            caption_style.padding
-                        )
-                        caption_clip = caption_clip.set_position(('center', y_position))
-                        
-                        caption_clips.append(caption_clip)
-                
-                # Composite video
-                final_video = CompositeVideoClip([video] + caption_clips)
-                
-                # Write final video
-                final_video.write_videofile(
-                    output_path,
-                    codec='libx264',
-                    audio_codec='aac',
-                    verbose=False,
-                    logger=None
-                )
-                
-                # Clean up
-                final_video.close()
-                for clip in caption_clips:
-                    clip.close()
-            
-            logger.info(f"Word-highlighted video created: {output_path}")
-            return output_path
+        logger.info(f"Creating word-highlighted video: {output_path}")
+        return await self.process_video(
+            video_path,
+            output_path,
+            caption_segments=caption_segments,
+            caption_style=caption_style,
+            highlight_color=highlight_color
+        )
+    
+    def _segments_to_karaoke_ass(
+        self,
+        segments: List[CaptionSegment],
+        style: CaptionStyle,
+        video_width: int,
+        video_height: int,
+        highlight_color: str
+    ) -> str:
+        """Build an ASS script whose \\k karaoke tags highlight each word as it is spoken"""
+        events = []
+        for segment in segments:
+            word_timings = self._split_segment_into_words(segment)
+            if not word_timings:
+                continue
             
-        except Exception as e:
-            logger.error(f"Error creating word-highlighted video: {e}")
-            raise
+            # Hold the first highlight until its word actually starts
+            lead_in = round(word_timings[0].start * 100) - round(segment.start_time * 100)
+            parts = [f"{{\\k{lead_in}}}"] if lead_in > 0 else []
+            parts.extend(
+                f"{{\\k{timing.duration_cs}}}{self._ass_escape(timing.word)}"
+                for timing in word_timings
+            )
+            events.append(
+                f"Dialogue: 0,{self._ass_timestamp(segment.start_time)},{self._ass_timestamp(segment.end_time)},"
+                f"Default,,0,0,0,,{' '.join(parts)}"
+            )
+        
+        header = self._ass_header(style, video_width, video_height, highlight_color)
+        return header + "\n".join(events) + "\n"
     
-    def _split_segment_into_words(self, segment: CaptionSegment) -> List[dict]:
+    def _split_segment_into_words(self, segment: CaptionSegment) -> List[WordTiming]:
         """Split caption segment into word-level timings"""
         try:
-            words = segment.text.split()
-            word_count = len(words)
-            segment_duration = segment.end_time - segment.start_time
-            
-            # Simple word timing calculation
-            # In a real implementation, you'd use Whisper's word-level timestamps
-            word_timings = []
-            time_per_word = segment_duration / word_count
-            
-            for i, word in enumerate(words):
-                start_time = segment.start_time + (i * time_per_word)
-                end_time = segment.start_time + ((i + 1) * time_per_word)
+            if segment.words:
+                # Timestamps the transcriber aligned for each word
+                words = [word.word for word in segment.words]
+                starts = [word.start for word in segment.words]
+                ends = [word.end for word in segment.words]
+            else:
+                words = segment.text.split()
+                word_count = len(words)
+                segment_duration = segment.end_time - segment.start_time
                 
-                word_timings.append({
-                    "word": word,
-                    "start": start_time,
-                    "end": end_time
-                })
+                # No word timestamps (e.g. older cached transcriptions): spread words evenly
+                time_per_word = segment_duration / word_count
+                edges = [segment.start_time + (i * time_per_word) for i in range(word_count + 1)]
+                starts, ends = edges[:-1], edges[1:]
             
-            return word_timings
+            return self._with_karaoke_durations(words, starts, ends)
             
         except Exception as e:
             logger.error(f"Error splitting segment into words: {e}")
             return []
     
+    def _with_karaoke_durations(
+        self, words: List[str], starts: List[float], ends: List[float]
+    ) -> List[WordTiming]:
+        """Pair each word with its ASS \\k duration in centiseconds, running up to the next word's start"""
+        # Differences of rounded absolute times, so rounding never accumulates into drift
+        karaoke_ends = starts[1:] + ends[-1:]
+        return [
+            WordTiming(word, start, end, max(0, round(karaoke_end * 100) - round(start * 100)))
+            for word, start, end, karaoke_end in zip(words, starts, ends, karaoke_ends)
+        ]
+    
     def _calculate_caption_position(
         self,
         video_height: int,
@@ -249,97 +455,40 @@ class VideoProcessor:
     ) -> int:
         """Calculate Y position for caption"""
         try:
-            if position.lower() == "top":
-                return padding
-            elif position.lower() == "center":
-                return (video_height - caption_height) // 2
-            else:  # bottom
-                return video_height - caption_height - padding
+            # Unknown positions fall back to bottom
+            y_position = CAPTION_Y_POSITIONS.get(position.lower(), CAPTION_Y_POSITIONS["bottom"])
+            return y_position(video_height, caption_height, padding)
                 
         except Exception as e:
             logger.warning(f"Error calculating caption position: {e}")
             return video_height - caption_height - padding
     
-    def resize_video(self, video_path: str, output_path: str, max_width: int = 1920) -> str:
+    async def resize_video(self, video_path: str, output_path: str, max_width: int = 1920) -> str:
         """Resize video to maximum width while maintaining aspect ratio"""
-        try:
-            from moviepy.editor import VideoFileClip
-            logger.info(f"Resizing video: {video_path}")
-            
-            with VideoFileClip(video_path) as video:
-                # Calculate new dimensions
-                width, height = video.size
-                if width <= max_width:
-                    # No resize needed
-                    video.write_videofile(output_path, verbose=False, logger=None)
-                    return output_path
-                
-                # Calculate new height maintaining aspect ratio
-                new_height = int((height * max_width) / width)
-                
-                # Resize video
-                resized_video = video.resize((max_width, new_height))
-                resized_video.write_videofile(output_path, verbose=False, logger=None)
-                resized_video.close()
-            
-            logger.info(f"Video resized: {output_path}")
-            return output_path
-            
-        except Exception as e:
-            logger.error(f"Error resizing video: {e}")
-            raise
+        logger.info(f"Resizing video: {video_path}")
+        return await self.process_video(video_path, output_path, max_width=max_width)
     
-    def compress_video(self, video_path: str, output_path: str, quality: str = "medium") -> str:
+    async def compress_video(self, video_path: str, output_path: str, quality: str = "medium") -> str:
         """Compress video for smaller file size"""
-        try:
-            from moviepy.editor import VideoFileClip
-            logger.info(f"Compressing video: {video_path}")
-            
-            # Quality settings
-            quality_settings = {
-                "low": {"bitrate": "500k", "crf": 28},
-                "medium": {"bitrate": "1000k", "crf": 23},
-                "high": {"bitrate": "2000k", "crf": 18}
-            }
-            
-            settings = quality_settings.get(quality, quality_settings["medium"])
-            
-            with VideoFileClip(video_path) as video:
-                video.write_videofile(
-                    output_path,
-                    codec='libx264',
-                    audio_codec='aac',
-                    bitrate=settings["bitrate"],
-                    verbose=False,
-                    logger=None
-                )
-            
-            logger.info(f"Video compressed: {output_path}")
-            return output_path
-            
-        except Exception as e:
-            logger.error(f"Error compressing video: {e}")
-            raise
+        logger.info(f"Compressing video: {video_path}")
+        return await self.process_video(video_path, output_path, quality=quality)
     
-    def create_thumbnail(self, video_path: str, output_path: str, timestamp: float = 1.0) -> str:
+    async def create_thumbnail(self, video_path: str, output_path: str, timestamp: float = 1.0) -> str:
         """Create thumbnail from video at specified timestamp"""
         try:
-            from moviepy.editor import VideoFileClip
-            from PIL import Image
             logger.info(f"Creating thumbnail from {video_path}")
             
-            with VideoFileClip(video_path) as video:
-                # Ensure timestamp is within video duration
-                timestamp = min(timestamp, video.duration - 0.1)
-                
-                # Get frame at timestamp
-                frame = video.get_frame(timestamp)
-                
-                # Convert to PIL Image
-                img = Image.fromarray(frame)
-                
-                # Save thumbnail
-                img.save(output_path)
+            # Ensure timestamp is within video duration
+            metadata = await self.get_video_metadata(video_path)
+            timestamp = max(0.0, min(timestamp, metadata["duration"] - 0.1))
+            
+            # Seek before the input so only the frames around the timestamp are decoded,
+            # and let ffmpeg encode the image straight to the output path
+            await self._run_ffmpeg(FFMPEG_BINARY, [
+                "-y", "-ss", f"{timestamp:.3f}", "-i", video_path,
+                "-frames:v", "1", "-update", "1",
+                output_path
+            ])
             
             logger.info(f"Thumbnail created: {output_path}")
             return output_path
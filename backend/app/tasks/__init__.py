@@ -3,10 +3,11 @@ Tasks package for Reely API
 Contains Celery task definitions for asynchronous processing
 """
 
-from .worker import celery_app, process_video_task, transcribe_audio_task, create_captions_task, cleanup_files_task, get_task_status
+from .worker import celery_app, enqueue_task, process_video_task, transcribe_audio_task, create_captions_task, cleanup_files_task, get_task_status
 
 __all__ = [
     'celery_app',
+    'enqueue_task',
     'process_video_task',
     'transcribe_audio_task', 
     'create_captions_task',
@@ -2,27 +2,113 @@
 Celery worker for asynchronous video processing tasks
 """
 import os
+import time
+import asyncio
+import atexit
 import logging
-from celery import Celery
-from celery.signals import worker_ready, worker_shutdown
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Dict, List, Optional, Tuple
+from celery import Celery, chain
+from celery.exceptions import SoftTimeLimitExceeded
+import orjson
+from kombu import Queue
+from kombu.serialization import register as register_serializer
+from pymongo import MongoClient
+from pymongo.errors import AutoReconnect
+from celery.signals import worker_process_init, worker_ready, worker_shutdown
 from datetime import datetime
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 
 from app.core.config import settings
 from app.services.video_processor import video_processor
 from app.services.transcription import transcription_service
 from app.services.storage import storage_service
-from app.models.schemas import CaptionStyle, ProcessingStatus
+from pydantic import TypeAdapter
+from app.models.schemas import CaptionSegment, CaptionStyle, ProcessingStatus
 from app.models import VideoDocument
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# Configure logging. Records are handed to a listener thread so task code never
+# blocks on a stream write; like basicConfig, this leaves existing setups alone.
+_log_queue = SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+_log_listener = QueueListener(_log_queue, _log_handler, respect_handler_level=True)
+if not logging.getLogger().handlers:
+    logging.getLogger().setLevel(logging.INFO)
+    logging.getLogger().addHandler(QueueHandler(_log_queue))
+    _log_listener.start()
 logger = logging.getLogger(__name__)
 
+
+def _stop_log_listener() -> None:
+    """Drain queued log records and stop the listener thread"""
+    if _log_listener._thread is not None:
+        _log_listener.stop()
+
+
+atexit.register(_stop_log_listener)
+
+# Dumps/validates a whole transcription in one pass through pydantic-core instead of per segment
+caption_segments_adapter = TypeAdapter(List[CaptionSegment])
+
+
+@lru_cache(maxsize=64)
+def _caption_style_from_items(items: tuple) -> CaptionStyle:
+    """Build a CaptionStyle once per distinct set of style fields"""
+    return CaptionStyle(**dict(items))
+
+
+def _caption_style(caption_style: dict) -> CaptionStyle:
+    """Get the (shared, read-only) CaptionStyle for a task's style dict"""
+    return _caption_style_from_items(tuple(sorted(caption_style.items())))
+
+# Deletes are I/O-bound, so a cleanup task fans out up to this many at once
+CLEANUP_MAX_WORKERS = 16
+
+# Transient failures are retried with jittered exponential backoff; bad input
+# (ValueError, FileNotFoundError, ...) still fails the job straight away
+RETRYABLE_ERRORS = (ConnectionError, TimeoutError, AutoReconnect)
+# A stage over its soft time limit has had its ffmpeg child killed by the
+# cancelled event loop, so it is requeued like any other transient failure
+RETRY_OPTIONS = {
+    'autoretry_for': RETRYABLE_ERRORS + (SoftTimeLimitExceeded,),
+    'retry_backoff': 60,
+    'retry_backoff_max': 600,
+    'retry_jitter': True,
+    'max_retries': 3,
+}
+# Whisper inference cannot be interrupted: after a soft timeout it keeps the single
+# shared inference thread busy, so a retry would only queue up behind it
+TRANSCRIBE_RETRY_OPTIONS = {**RETRY_OPTIONS, 'autoretry_for': RETRYABLE_ERRORS}
+
+# Headroom between a stage's soft limit and the hard kill, for cleanup and the retry
+HARD_TIME_LIMIT_GRACE = 60
+
+
+def _stage_time_limits(soft_limit: int) -> dict:
+    """Task options for a stage with the given soft time limit"""
+    return {'soft_time_limit': soft_limit, 'time_limit': soft_limit + HARD_TIME_LIMIT_GRACE}
+
+
 # Choose broker/backend based on mode (avoid Redis in debug/eager)
 USE_EAGER = settings.debug or os.getenv("CELERY_EAGER", "0") == "1"
 BROKER_URL = "memory://" if USE_EAGER else settings.celery_broker_url
-RESULT_BACKEND = "cache+memory://" if USE_EAGER else settings.celery_result_backend
+# Eager tasks hand their result straight back, so they get no result backend at all;
+# the in-memory cache backend only left AsyncResult.get() calls hanging
+RESULT_BACKEND = None if USE_EAGER else settings.celery_result_backend
+
+# orjson encodes the float-heavy task payloads several times faster than stdlib json
+register_serializer(
+    'orjson',
+    orjson.dumps,
+    orjson.loads,
+    content_type='application/x-orjson',
+    content_encoding='utf-8',
+)
 
 # Initialize Celery
 celery_app = Celery(
@@ -34,16 +120,44 @@ celery_app = Celery(
 
 # Celery configuration
 celery_app.conf.update(
-    task_serializer='json',
-    accept_content=['json'],
-    result_serializer='json',
+    # json is still accepted so messages queued by the json-only release drain cleanly
+    task_serializer='orjson',
+    accept_content=['orjson', 'json'],
+    result_serializer='orjson',
     timezone='UTC',
     enable_utc=True,
     task_track_started=True,
+    # Results only carry ids now, so they need not outlive a polling session
+    result_expires=3600,
+    result_extended=False,
+    result_backend_max_retries=3,
     task_time_limit=3600,  # 1 hour
     task_soft_time_limit=3300,  # 55 minutes
-    worker_prefetch_multiplier=1,
-    task_acks_late=True,
+    worker_prefetch_multiplier=settings.celery_worker_prefetch_multiplier,
+    task_acks_late=settings.celery_task_acks_late,
+    task_reject_on_worker_lost=settings.celery_task_reject_on_worker_lost,
+    # 0 disables recycling; Celery itself only accepts a positive int or None
+    worker_max_tasks_per_child=settings.celery_worker_max_tasks_per_child or None,
+    worker_max_memory_per_child=settings.celery_worker_max_memory_per_child or None,
+    # CPU-heavy video work gets its own queue so it can't starve short tasks.
+    # Workers started without -Q consume every queue.
+    task_default_queue='celery',
+    task_queues=(
+        Queue('celery', routing_key='celery'),
+        Queue(settings.celery_video_queue, routing_key=settings.celery_video_queue),
+        Queue(settings.celery_transcription_queue, routing_key=settings.celery_transcription_queue),
+        Queue(settings.celery_light_queue, routing_key=settings.celery_light_queue),
+    ),
+    task_routes={
+        # process_video itself only fans out into the stage chain, so it stays on the default queue
+        'process_video.extract_audio': {'queue': settings.celery_video_queue},
+        'process_video.transcribe': {'queue': settings.celery_transcription_queue},
+        'process_video.create_captions': {'queue': settings.celery_video_queue},
+        'transcribe_audio_only': {'queue': settings.celery_transcription_queue},
+        'create_captions_only': {'queue': settings.celery_video_queue},
+        # Prefetch is per worker, so these get their own queue for a worker run with a high multiplier
+        'cleanup_files': {'queue': settings.celery_light_queue},
+    },
 )
 
 # Enable in-process execution for local/dev (no Redis needed)
@@ -51,200 +165,256 @@ if USE_EAGER:
     celery_app.conf.update(
         task_always_eager=True,
         task_eager_propagates=True,
+        task_ignore_result=True,
     )
 
 
+async def enqueue_task(task, task_id: str, **kwargs):
+    """Publish a task without blocking the event loop on the broker round trip"""
+    return await asyncio.to_thread(task.apply_async, kwargs=kwargs, task_id=task_id)
+
+
 @celery_app.task(bind=True, name='process_video')
 def process_video_task(self, video_id: str, video_path: str, caption_style: dict):
     """Main task for processing video with captions"""
-    try:
-        logger.info(f"Starting video processing task for video_id: {video_id}")
-        
-        # Update task status
-        self.update_state(
-            state='PROGRESS',
-            meta={'current_step': 'extracting_audio', 'progress': 10}
-        )
-        
-        # Extract audio
-        audio_filename = f"{video_id}_audio.wav"
-        audio_path = os.path.join(settings.processed_dir, audio_filename)
-        video_processor.extract_audio(video_path, audio_path)
-        
-        # Update progress
-        self.update_state(
-            state='PROGRESS',
-            meta={'current_step': 'transcribing_audio', 'progress': 30}
-        )
-        
-        # Transcribe audio
-        caption_segments = transcription_service.transcribe_audio(audio_path, video_id)
-        
-        # Update progress
-        self.update_state(
-            state='PROGRESS',
-            meta={'current_step': 'creating_captions', 'progress': 60}
-        )
-        
-        # Create captioned video
-        caption_style_obj = CaptionStyle(**caption_style)
-        output_filename = f"{video_id}_captioned.mp4"
-        output_path = os.path.join(settings.processed_dir, output_filename)
-        
-        video_processor.create_captioned_video(
-            video_path,
-            caption_segments,
-            caption_style_obj,
-            output_path
-        )
-        
-        # Update progress
-        self.update_state(
-            state='PROGRESS',
-            meta={'current_step': 'finalizing', 'progress': 90}
+    logger.info("Starting video processing task for video_id: %s", video_id)
+    
+    job = {
+        'video_id': video_id,
+        'video_path': video_path,
+        'caption_style': caption_style,
+        # Progress and the final result are reported under the id callers poll
+        'status_task_id': self.request.id,
+    }
+    
+    # Each stage runs on its own queue, so ffmpeg and Whisper workers scale independently.
+    # The last stage inherits this task's id, which keeps get_task_status working unchanged.
+    if settings.persist_extracted_audio:
+        stages = [extract_audio_stage.s(job), transcribe_stage.s()]
+    else:
+        # Whisper decodes the video's audio track in memory, so no WAV hop through disk
+        stages = [transcribe_stage.s({**job, 'audio_path': None})]
+    return self.replace(chain(*stages, create_captions_stage.s()))
+
+
+_mongo_client = None
+
+
+def _videos_collection():
+    """Get the videos collection through a per-process sync client"""
+    # Stages run their async work under separate asyncio.run loops, which a Motor client can't span
+    global _mongo_client
+    if _mongo_client is None:
+        _mongo_client = MongoClient(
+            settings.mongodb_url,
+            serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms,
+            retryWrites=True,
+            compressors=settings.mongo_compressors,
         )
-        
-        # Get video metadata
-        metadata = video_processor.get_video_metadata(video_path)
-        
-        # Update progress
-        self.update_state(
-            state='PROGRESS',
-            meta={'current_step': 'completed', 'progress': 100}
+    return _mongo_client[settings.database_name]["videos"]
+
+
+def _store_transcription(video_id: str, caption_segments: list) -> None:
+    """Save a transcription on the video document so tasks can pass just the id"""
+    _videos_collection().update_one(
+        {'video_id': video_id},
+        {'$set': {
+            'transcription': caption_segments_adapter.dump_python(caption_segments, mode='json'),
+            'updated_at': datetime.utcnow()
+        }}
+    )
+
+
+def _load_transcription(video_id: str) -> list:
+    """Load the stored transcription for a video as CaptionSegment objects"""
+    video = _videos_collection().find_one({'video_id': video_id}, {'_id': 0, 'transcription': 1})
+    if not video or video.get('transcription') is None:
+        raise ValueError(f"No transcription stored for video {video_id}")
+    return caption_segments_adapter.validate_python(video['transcription'])
+
+
+def _report_progress(task, task_id: str, step: str, progress: int) -> None:
+    """Record progress against the task id the API polls"""
+    task.update_state(
+        task_id=task_id,
+        state='PROGRESS',
+        meta={'current_step': step, 'progress': progress}
+    )
+
+
+def _will_retry(task, error: Exception) -> bool:
+    """Whether autoretry is about to run the task again for this error"""
+    return isinstance(error, task.autoretry_for) and task.request.retries < task.max_retries
+
+
+def _report_failure(task, job: dict, error: Exception) -> None:
+    """Record a stage failure on the video document and the polled task id"""
+    # The chain stops here, so the task owning that id will never run to record it
+    if task.request.id != job['status_task_id']:
+        task.backend.mark_as_failure(job['status_task_id'], error)
+    try:
+        _videos_collection().update_one(
+            {'video_id': job['video_id']},
+            {'$set': {'status': 'failed', 'error_message': str(error), 'updated_at': datetime.utcnow()}}
         )
-        
-        # Return result
-        result = {
-            'video_id': video_id,
-            'status': 'completed',
-            'processed_path': output_path,
-            'audio_path': audio_path,
-            'transcription': [seg.dict() for seg in caption_segments],
-            'metadata': metadata,
-            'caption_style': caption_style_obj.dict()
-        }
-        
-        logger.info(f"Video processing completed for video_id: {video_id}")
-        return result
-        
     except Exception as e:
-        logger.error(f"Error processing video {video_id}: {e}")
-        
-        # Update task state with error
-        self.update_state(
-            state='FAILURE',
-            meta={'error': str(e), 'current_step': 'failed'}
-        )
-        
-        raise
+        logger.error("Error recording failure for video %s: %s", job['video_id'], e)
 
 
-@celery_app.task(bind=True, name='transcribe_audio_only')
-def transcribe_audio_task(self, video_id: str, audio_path: str):
-    """Task for audio transcription only"""
+@contextmanager
+def _task_lifecycle(task, video_id: str, action: str, job: Optional[dict] = None):
+    """Log a task failure and, for pipeline stages, record it once no retry is left"""
+    # Standalone tasks need no recording: Celery stores the exception under their own id
     try:
-        logger.info(f"Starting audio transcription for video_id: {video_id}")
-        
-        # Update task status
-        self.update_state(
-            state='PROGRESS',
-            meta={'current_step': 'transcribing', 'progress': 50}
-        )
-        
-        # Transcribe audio
-        caption_segments = transcription_service.transcribe_audio(audio_path, video_id)
-        
-        # Update progress
-        self.update_state(
-            state='PROGRESS',
-            meta={'current_step': 'completed', 'progress': 100}
-        )
-        
-        result = {
-            'video_id': video_id,
-            'status': 'completed',
-            'transcription': [seg.dict() for seg in caption_segments]
-        }
-        
-        logger.info(f"Audio transcription completed for video_id: {video_id}")
-        return result
-        
+        yield
     except Exception as e:
-        logger.error(f"Error transcribing audio {video_id}: {e}")
-        
-        self.update_state(
-            state='FAILURE',
-            meta={'error': str(e), 'current_step': 'failed'}
-        )
-        
+        logger.error("Error %s for video %s: %s", action, video_id, e)
+        if job is not None and not _will_retry(task, e):
+            _report_failure(task, job, e)
         raise
 
 
-@celery_app.task(bind=True, name='create_captions_only')
-def create_captions_task(self, video_id: str, video_path: str, transcription: list, caption_style: dict):
-    """Task for creating captions only (when transcription already exists)"""
-    try:
-        logger.info(f"Starting caption creation for video_id: {video_id}")
-        
-        # Update task status
-        self.update_state(
-            state='PROGRESS',
-            meta={'current_step': 'creating_captions', 'progress': 50}
-        )
+def _result(video_id: str, **extra) -> dict:
+    """Build the small result a finished task hands to the result backend"""
+    return {'video_id': video_id, 'status': 'completed', **extra}
+
+
+def _transcribe(video_id: str, source_path: str) -> int:
+    """Transcribe a file onto the video document and return the segment count"""
+    caption_segments = asyncio.run(transcription_service.transcribe_audio(source_path, video_id))
+    # Only the id moves on through the broker; the segments wait on the video document
+    _store_transcription(video_id, caption_segments)
+    return len(caption_segments)
+
+
+def _render_captions(video_id: str, video_path: str, caption_style: dict) -> Tuple[str, CaptionStyle]:
+    """Burn the stored transcription into the video and return the output path and style"""
+    caption_segments = _load_transcription(video_id)
+    caption_style_obj = _caption_style(caption_style)
+    output_path = os.path.join(settings.processed_dir, f"{video_id}_captioned.mp4")
+    
+    asyncio.run(video_processor.create_captioned_video(
+        video_path,
+        caption_segments,
+        caption_style_obj,
+        output_path
+    ))
+    return output_path, caption_style_obj
+
+
+@celery_app.task(
+    bind=True,
+    name='process_video.extract_audio',
+    **RETRY_OPTIONS,
+    **_stage_time_limits(settings.celery_extract_audio_time_limit),
+)
+def extract_audio_stage(self, job: dict):
+    """Pipeline stage: extract the audio track to a WAV"""
+    with _task_lifecycle(self, job['video_id'], 'extracting audio', job):
+        _report_progress(self, job['status_task_id'], 'extracting_audio', 10)
+        
+        audio_path = os.path.join(settings.processed_dir, f"{job['video_id']}_audio.wav")
+        asyncio.run(video_processor.extract_audio(job['video_path'], audio_path))
+        return {**job, 'audio_path': audio_path}
+
+
+@celery_app.task(
+    bind=True,
+    name='process_video.transcribe',
+    **TRANSCRIBE_RETRY_OPTIONS,
+    **_stage_time_limits(settings.celery_transcribe_time_limit),
+)
+def transcribe_stage(self, job: dict):
+    """Pipeline stage: transcribe the extracted audio"""
+    with _task_lifecycle(self, job['video_id'], 'transcribing', job):
+        _report_progress(self, job['status_task_id'], 'transcribing_audio', 30)
         
-        # Convert transcription back to objects
-        from app.models.schemas import CaptionSegment
-        caption_segments = [CaptionSegment(**seg) for seg in transcription]
+        _transcribe(job['video_id'], job['audio_path'] or job['video_path'])
+        return job
+
+
+@celery_app.task(
+    bind=True,
+    name='process_video.create_captions',
+    **RETRY_OPTIONS,
+    **_stage_time_limits(settings.celery_caption_time_limit),
+)
+def create_captions_stage(self, job: dict):
+    """Pipeline stage: burn the captions in and assemble the task result"""
+    video_id = job['video_id']
+    with _task_lifecycle(self, video_id, 'processing', job):
+        _report_progress(self, job['status_task_id'], 'creating_captions', 60)
         
-        # Create captioned video
-        caption_style_obj = CaptionStyle(**caption_style)
-        output_filename = f"{video_id}_captioned.mp4"
-        output_path = os.path.join(settings.processed_dir, output_filename)
+        output_path, caption_style_obj = _render_captions(video_id, job['video_path'], job['caption_style'])
         
-        video_processor.create_captioned_video(
-            video_path,
-            caption_segments,
-            caption_style_obj,
-            output_path
-        )
+        _report_progress(self, job['status_task_id'], 'finalizing', 90)
+        metadata = asyncio.run(video_processor.get_video_metadata(job['video_path']))
         
-        # Update progress
-        self.update_state(
-            state='PROGRESS',
-            meta={'current_step': 'completed', 'progress': 100}
+        # The video document holds the payload; the result backend only keeps the id
+        _videos_collection().update_one(
+            {'video_id': video_id},
+            {'$set': {
+                'status': 'completed',
+                'updated_at': datetime.utcnow(),
+                'progress_percentage': 100,
+                'current_step': 'completed',
+                'processed_path': output_path,
+                'audio_path': job['audio_path'],
+                'metadata': metadata,
+                'caption_style': caption_style_obj.model_dump()
+            }}
         )
         
-        result = {
-            'video_id': video_id,
-            'status': 'completed',
-            'processed_path': output_path,
-            'caption_style': caption_style_obj.dict()
-        }
+        logger.info("Video processing completed for video_id: %s", video_id)
+        return _result(video_id, processed_path=output_path)
+
+
+@celery_app.task(
+    bind=True,
+    name='transcribe_audio_only',
+    **TRANSCRIBE_RETRY_OPTIONS,
+    **_stage_time_limits(settings.celery_transcribe_time_limit),
+)
+def transcribe_audio_task(self, video_id: str, audio_path: str):
+    """Task for audio transcription only"""
+    with _task_lifecycle(self, video_id, 'transcribing audio'):
+        logger.info("Starting audio transcription for video_id: %s", video_id)
+        _report_progress(self, self.request.id, 'transcribing', 50)
         
-        logger.info(f"Caption creation completed for video_id: {video_id}")
-        return result
+        segment_count = _transcribe(video_id, audio_path)
         
-    except Exception as e:
-        logger.error(f"Error creating captions {video_id}: {e}")
+        logger.info("Audio transcription completed for video_id: %s", video_id)
+        return _result(video_id, segment_count=segment_count)
+
+
+@celery_app.task(
+    bind=True,
+    name='create_captions_only',
+    **RETRY_OPTIONS,
+    **_stage_time_limits(settings.celery_caption_time_limit),
+)
+def create_captions_task(self, video_id: str, video_path: str, caption_style: dict):
+    """Task for creating captions only (when transcription already exists)"""
+    with _task_lifecycle(self, video_id, 'creating captions'):
+        logger.info("Starting caption creation for video_id: %s", video_id)
+        _report_progress(self, self.request.id, 'creating_captions', 50)
         
-        self.update_state(
-            state='FAILURE',
-            meta={'error': str(e), 'current_step': 'failed'}
-        )
+        output_path, caption_style_obj = _render_captions(video_id, video_path, caption_style)
         
-        raise
+        logger.info("Caption creation completed for video_id: %s", video_id)
+        return _result(video_id, processed_path=output_path, caption_style=caption_style_obj.model_dump())
 
 
-@celery_app.task(bind=True, name='cleanup_files')
+@celery_app.task(bind=True, name='cleanup_files', ignore_result=True)
 def cleanup_files_task(self, file_paths: list):
     """Task for cleaning up temporary files"""
     try:
-        logger.info(f"Starting cleanup task for {len(file_paths)} files")
+        logger.info("Starting cleanup task for %s files", len(file_paths))
         
         cleaned_count = 0
-        for file_path in file_paths:
-            if storage_service.delete_file(file_path):
-                cleaned_count += 1
+        if file_paths:
+            with ThreadPoolExecutor(max_workers=min(CLEANUP_MAX_WORKERS, len(file_paths))) as executor:
+                cleaned_count = sum(executor.map(storage_service.delete_file_sync, file_paths))
         
         result = {
             'status': 'completed',
@@ -252,11 +422,11 @@ def cleanup_files_task(self, file_paths: list):
             'total_files': len(file_paths)
         }
         
-        logger.info(f"Cleanup completed: {cleaned_count}/{len(file_paths)} files")
+        logger.info("Cleanup completed: %s/%s files", cleaned_count, len(file_paths))
         return result
         
     except Exception as e:
-        logger.error(f"Error in cleanup task: {e}")
+        logger.error("Error in cleanup task: %s", e)
         raise
 
 
@@ -266,17 +436,59 @@ def worker_ready_handler(sender=None, **kwargs):
     logger.info("Celery worker is ready")
 
 
+def _consumes_transcription_queue() -> bool:
+    """Whether this worker takes Whisper tasks; one started without -Q consumes every queue"""
+    consume_from = celery_app.amqp.queues.consume_from
+    return not consume_from or settings.celery_transcription_queue in consume_from
+
+
+@worker_process_init.connect
+def worker_process_init_handler(sender=None, **kwargs):
+    """Load the Whisper model in each transcription pool process before it takes a task"""
+    # ffmpeg and cleanup workers never transcribe, so they skip the weights entirely
+    if not settings.preload_whisper_model or not _consumes_transcription_queue():
+        return
+    # Loaded after the fork: CUDA contexts and CTranslate2 thread pools don't survive one
+    try:
+        transcription_service.load_model()
+    except Exception as e:
+        # Not fatal; the first transcription retries the load
+        logger.error("Error preloading Whisper model: %s", e)
+
+
 @worker_shutdown.connect
 def worker_shutdown_handler(sender=None, **kwargs):
     """Handler for when worker is shutting down"""
     logger.info("Celery worker is shutting down")
     # Cleanup any resources
     video_processor.cleanup_temp_files()
+    _stop_log_listener()
 
 
 # Task status tracking
-def get_task_status(task_id: str) -> dict:
-    """Get status of a Celery task"""
+TASK_STATUS_CACHE_MAXSIZE = 10000
+_task_status_cache: Dict[str, Tuple[float, dict]] = {}
+
+
+def get_task_status(task_id: str, use_cache: bool = True) -> dict:
+    """Get status of a Celery task, served from a short-TTL cache when fresh"""
+    now = time.monotonic()
+    cached = _task_status_cache.get(task_id)
+    if use_cache and cached and now - cached[0] < settings.task_status_cache_ttl:
+        return cached[1]
+    
+    task_status = _fetch_task_status(task_id)
+    if task_status['status'] != 'error':
+        if len(_task_status_cache) >= TASK_STATUS_CACHE_MAXSIZE:
+            # Evict the oldest entry (dicts keep insertion order)
+            _task_status_cache.pop(next(iter(_task_status_cache)))
+        _task_status_cache.pop(task_id, None)
+        _task_status_cache[task_id] = (now, task_status)
+    return task_status
+
+
+def _fetch_task_status(task_id: str) -> dict:
+    """Query the result backend for the status of a Celery task"""
     try:
         task = celery_app.AsyncResult(task_id)
         
@@ -286,7 +498,7 @@ def get_task_status(task_id: str) -> dict:
                 'progress': 0,
                 'current_step': 'queued'
             }
-        elif task.state == 'PROGRESS':
+        elif task.state in ('PROGRESS', 'STARTED'):
             return {
                 'status': 'processing',
                 'progress': task.info.get('progress', 0),
@@ -314,7 +526,7 @@ def get_task_status(task_id: str) -> dict:
             }
             
     except Exception as e:
-        logger.error(f"Error getting task status: {e}")
+        logger.error("Error getting task status: %s", e)
         return {
             'status': 'error',
             'progress': 0,
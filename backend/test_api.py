@@ -2,16 +2,21 @@
 Simple test script for the Reely API
 """
 import requests
-import time
+from requests.adapters import HTTPAdapter
 import json
 
 API_BASE_URL = "http://localhost:8000"
 
+# One keep-alive session for every request instead of a new connection per call
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
 def test_health_check():
     """Test health check endpoint"""
     print("🔍 Testing health check...")
     try:
-        response = requests.get(f"{API_BASE_URL}/health")
+        response = SESSION.get(f"{API_BASE_URL}/health")
         if response.status_code == 200:
             print("✅ Health check passed")
             return True
@@ -26,7 +31,7 @@ def test_api_health():
     """Test API health endpoint"""
     print("🔍 Testing API health...")
     try:
-        response = requests.get(f"{API_BASE_URL}/api/health")
+        response = SESSION.get(f"{API_BASE_URL}/api/health")
         if response.status_code == 200:
             print("✅ API health check passed")
             return True
@@ -41,7 +46,7 @@ def test_video_list():
     """Test video list endpoint"""
     print("🔍 Testing video list...")
     try:
-        response = requests.get(f"{API_BASE_URL}/api/videos")
+        response = SESSION.get(f"{API_BASE_URL}/api/videos")
         if response.status_code == 200:
             data = response.json()
             print(f"✅ Video list retrieved: {data['total']} videos")
@@ -71,7 +76,7 @@ def test_video_upload_url():
             "position": "bottom"
         }
         
-        response = requests.post(f"{API_BASE_URL}/api/upload", data=data)
+        response = SESSION.post(f"{API_BASE_URL}/api/upload", data=data)
         if response.status_code == 200:
             result = response.json()
             print(f"✅ Video upload initiated: {result['video_id']}")
@@ -84,11 +89,16 @@ def test_video_upload_url():
         print(f"❌ Video upload error: {e}")
         return None
 
-def test_video_status(video_id):
+def test_video_status(video_id, wait=False):
     """Test video status endpoint"""
     print(f"🔍 Testing video status for {video_id}...")
     try:
-        response = requests.get(f"{API_BASE_URL}/api/video/{video_id}/status")
+        # A waiting request is held server-side for up to 30s until processing finishes
+        response = SESSION.get(
+            f"{API_BASE_URL}/api/video/{video_id}/status",
+            params={"wait": "true"} if wait else None,
+            timeout=35 if wait else 10
+        )
         if response.status_code == 200:
             data = response.json()
             print(f"✅ Video status: {data['status']} ({data['progress_percentage']}%)")
@@ -104,7 +114,7 @@ def test_video_details(video_id):
     """Test video details endpoint"""
     print(f"🔍 Testing video details for {video_id}...")
     try:
-        response = requests.get(f"{API_BASE_URL}/api/video/{video_id}")
+        response = SESSION.get(f"{API_BASE_URL}/api/video/{video_id}")
         if response.status_code == 200:
             data = response.json()
             print(f"✅ Video details retrieved: {data['filename']}")
@@ -142,10 +152,9 @@ def main():
         # Test status (poll a few times)
         print("\n⏳ Polling video status...")
         for i in range(5):
-            status = test_video_status(video_id)
+            status = test_video_status(video_id, wait=True)
             if status and status['status'] in ['completed', 'failed']:
                 break
-            time.sleep(2)
     
     print("\n" + "=" * 50)
     print("🏁 Tests completed!")
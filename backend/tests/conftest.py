@@ -0,0 +1,36 @@
+"""
+Shared pytest fixtures
+"""
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from app.services.storage import StorageService
+
+
+@pytest.fixture(scope="session")
+def event_loop():
+    """One event loop shared by every async test and session-scoped async fixture"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+@pytest.fixture(scope="session")
+def storage():
+    """One StorageService for the session; each instance owns a file I/O thread pool"""
+    service = StorageService()
+    yield service
+    service.executor.shutdown(wait=True)
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def _no_leaked_tasks():
+    """Fail a test that leaves tasks running on the shared loop, so they can't reach later tests"""
+    yield
+    await asyncio.sleep(0)
+    leaked = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in leaked:
+        task.cancel()
+    assert not leaked, f"Tasks left running on the shared event loop: {leaked}"
@@ -3,93 +3,153 @@ Comprehensive test suite for the Reely API
 """
 import pytest
 import asyncio
-import os
-import tempfile
-from unittest.mock import Mock, patch, AsyncMock
-from fastapi.testclient import TestClient
+import io
+import threading
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest.mock import DEFAULT, MagicMock, Mock, patch, AsyncMock
+import httpx
+import pytest_asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from app.main import app
 from app.core.config import settings
 from app.models.schemas import CaptionStyle, ProcessingStatus
-from app.services.storage import StorageService
 from app.services.transcription import TranscriptionService
 from app.services.video_processor import VideoProcessor
+from app.api.dependencies import Database
+from app.tasks.worker import celery_app, process_video_task
 
-# Test client
-client = TestClient(app)
+# Caption style form fields shared by the upload tests
+_UPLOAD_FORM = {
+    "font_type": "Arial",
+    "font_size": "24",
+    "font_color": "#FFFFFF",
+    "stroke_color": "#000000",
+    "stroke_width": "2",
+    "padding": "10",
+    "position": "bottom"
+}
+
+# Stored document for a finished video, built once for the module
+_SAMPLE_VIDEO_DATA = {
+    "video_id": "test-video-123",
+    "filename": "test-video.mp4",
+    "status": "completed",
+    "created_at": "2023-01-01T00:00:00Z",
+    "updated_at": "2023-01-01T00:05:00Z",
+    "original_path": "/uploads/test-video.mp4",
+    "processed_path": "/processed/test-video-captioned.mp4",
+    "metadata": {
+        "duration": 120.5,
+        "width": 1920,
+        "height": 1080,
+        "fps": 30.0,
+        "format": "mp4",
+        "size_bytes": 1024000
+    },
+    "transcription": [
+        {
+            "start_time": 0.0,
+            "end_time": 5.0,
+            "text": "Hello, welcome to our video.",
+            "confidence": 0.95
+        }
+    ],
+    "caption_style": {
+        "font_type": "Arial",
+        "font_size": 24,
+        "font_color": "#FFFFFF",
+        "stroke_color": "#000000",
+        "stroke_width": 2,
+        "padding": 10,
+        "position": "bottom"
+    }
+}
+
+# Database mock specced once against a real (unconnected) Database; reset per test
+_MOCK_DB_TEMPLATE = MagicMock(spec=Database())
+
+def _areturn(value):
+    """Coroutine function returning value; cheaper than an AsyncMock when calls aren't asserted"""
+    async def _f(*args, **kwargs):
+        return value
+    return _f
+
+def _routed_queue(task) -> str:
+    """Name of the queue Celery routes task to"""
+    return celery_app.amqp.router.route({}, task.name)["queue"].name
+
+def _cursor(documents):
+    """Motor-style cursor: find() and its chain are sync, only to_list is awaited"""
+    cursor = Mock()
+    cursor.skip.return_value = cursor
+    cursor.sort.return_value = cursor
+    cursor.limit.return_value = cursor
+    cursor.to_list = _areturn(documents)
+    return cursor
+
+@pytest_asyncio.fixture(scope="session")
+async def aclient():
+    """Async client bound to the app in-process, so requests can overlap"""
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as c:
+        yield c
+
+@pytest.fixture(scope="session")
+def _db_patch():
+    """Patch the database handle the routes use, once for the whole session"""
+    with patch('app.api.routes.database', _MOCK_DB_TEMPLATE) as mock_db:
+        yield mock_db
 
 @pytest.fixture
-def mock_database():
+def mock_database(_db_patch):
     """Mock database for testing"""
-    with patch('app.api.dependencies.database') as mock_db:
-        mock_collection = AsyncMock()
-        mock_db.get_collection.return_value = mock_collection
-        yield mock_db, mock_collection
+    # Fresh collection per test so configured return values can't leak between tests
+    _db_patch.reset_mock(return_value=True, side_effect=True)
+    mock_collection = AsyncMock()
+    _db_patch.get_collection.return_value = mock_collection
+    yield _db_patch, mock_collection
+
+@pytest.fixture
+def mocked_services():
+    """Patch the storage service, the broker publish and local processing as the routes see them"""
+    with ExitStack() as stack:
+        storage = stack.enter_context(patch('app.api.routes.storage_service'))
+        enqueue = stack.enter_context(patch('app.api.routes.enqueue_task', new_callable=AsyncMock))
+        # Debug-mode uploads would otherwise leave real processing running on the shared loop
+        process = stack.enter_context(patch('app.api.routes._process_video_async', new_callable=AsyncMock))
+        yield SimpleNamespace(storage=storage, enqueue=enqueue, process=process)
 
 @pytest.fixture
 def sample_video_data():
-    """Sample video data for testing"""
-    return {
-        "video_id": "test-video-123",
-        "filename": "test-video.mp4",
-        "status": "completed",
-        "created_at": "2023-01-01T00:00:00Z",
-        "updated_at": "2023-01-01T00:05:00Z",
-        "original_path": "/uploads/test-video.mp4",
-        "processed_path": "/processed/test-video-captioned.mp4",
-        "metadata": {
-            "duration": 120.5,
-            "width": 1920,
-            "height": 1080,
-            "fps": 30.0,
-            "format": "mp4",
-            "size_bytes": 1024000
-        },
-        "transcription": [
-            {
-                "start_time": 0.0,
-                "end_time": 5.0,
-                "text": "Hello, welcome to our video.",
-                "confidence": 0.95
-            }
-        ],
-        "caption_style": {
-            "font_type": "Arial",
-            "font_size": 24,
-            "font_color": "#FFFFFF",
-            "stroke_color": "#000000",
-            "stroke_width": 2,
-            "padding": 10,
-            "position": "bottom"
-        }
-    }
+    """Sample video data for testing (shared; copy it before mutating)"""
+    return _SAMPLE_VIDEO_DATA
 
 class TestHealthEndpoints:
     """Test health check endpoints"""
     
-    def test_root_endpoint(self):
+    async def test_root_endpoint(self, aclient):
         """Test root endpoint"""
-        response = client.get("/")
+        response = await aclient.get("/")
         assert response.status_code == 200
         data = response.json()
         assert "message" in data
         assert data["message"] == "Welcome to Reely API"
     
-    def test_health_endpoint(self):
+    async def test_health_endpoint(self, aclient):
         """Test health check endpoint"""
-        response = client.get("/health")
+        response = await aclient.get("/health")
         assert response.status_code == 200
         data = response.json()
         assert data["status"] == "healthy"
         assert data["service"] == "Reely API"
     
-    def test_api_health_endpoint(self, mock_database):
+    async def test_api_health_endpoint(self, aclient, mock_database):
         """Test API health endpoint"""
         mock_db, mock_collection = mock_database
-        mock_db.client.admin.command = AsyncMock(return_value={"ok": 1})
+        mock_db.client.admin.command = _areturn({"ok": 1})
         
-        response = client.get("/api/health")
+        response = await aclient.get("/api/health")
         assert response.status_code == 200
         data = response.json()
         assert data["status"] == "healthy"
@@ -98,157 +158,257 @@ class TestHealthEndpoints:
 class TestVideoUpload:
     """Test video upload functionality"""
     
-    def test_upload_without_file_or_url(self):
+    async def test_upload_without_file_or_url(self, aclient):
         """Test upload without file or URL"""
-        response = client.post("/api/upload")
+        response = await aclient.post("/api/upload")
         assert response.status_code == 422  # Validation error
     
-    def test_upload_with_invalid_file_type(self):
+    @pytest.mark.parametrize("filename,content_type", [
+        ("test.txt", "text/plain"),
+        ("test.exe", "application/octet-stream"),
+        ("test.mp3", "audio/mpeg"),
+    ])
+    async def test_upload_with_invalid_file_type(self, aclient, filename, content_type):
         """Test upload with invalid file type"""
-        with tempfile.NamedTemporaryFile(suffix=".txt") as temp_file:
-            temp_file.write(b"test content")
-            temp_file.flush()
-            
-            with open(temp_file.name, "rb") as f:
-                response = client.post(
-                    "/api/upload",
-                    files={"video_file": ("test.txt", f, "text/plain")},
-                    data={
-                        "font_type": "Arial",
-                        "font_size": "24",
-                        "font_color": "#FFFFFF",
-                        "stroke_color": "#000000",
-                        "stroke_width": "2",
-                        "padding": "10",
-                        "position": "bottom"
-                    }
-                )
-                assert response.status_code == 400
-                assert "Unsupported video format" in response.json()["detail"]
+        response = await aclient.post(
+            "/api/upload",
+            files={"video_file": (filename, io.BytesIO(b"not a video"), content_type)},
+            data=_UPLOAD_FORM
+        )
+        assert response.status_code == 400
+        assert "Unsupported video format" in response.json()["detail"]
     
-    def test_upload_with_valid_file(self, mock_database):
+    async def test_upload_with_valid_file(self, aclient, mock_database, mocked_services, monkeypatch):
         """Test upload with valid video file"""
         mock_db, mock_collection = mock_database
         mock_collection.insert_one = AsyncMock()
         mock_collection.update_one = AsyncMock()
+        # Take the broker path, as outside debug mode
+        monkeypatch.setattr(settings, "debug", False)
         
-        # Mock file operations
-        with patch('app.services.storage.storage_service') as mock_storage:
-            mock_storage.save_uploaded_file = AsyncMock(return_value="/uploads/test.mp4")
-            mock_storage.generate_unique_filename.return_value = "test.mp4"
-            
-            # Mock Celery task
-            with patch('app.tasks.worker.process_video_task') as mock_task:
-                mock_task.delay.return_value = Mock(id="task-123")
-                
-                with tempfile.NamedTemporaryFile(suffix=".mp4") as temp_file:
-                    temp_file.write(b"fake video content")
-                    temp_file.flush()
-                    
-                    with open(temp_file.name, "rb") as f:
-                        response = client.post(
-                            "/api/upload",
-                            files={"video_file": ("test.mp4", f, "video/mp4")},
-                            data={
-                                "font_type": "Arial",
-                                "font_size": "24",
-                                "font_color": "#FFFFFF",
-                                "stroke_color": "#000000",
-                                "stroke_width": "2",
-                                "padding": "10",
-                                "position": "bottom"
-                            }
-                        )
-                        assert response.status_code == 200
-                        data = response.json()
-                        assert "video_id" in data
-                        assert data["status"] == "pending"
+        mocked_services.storage.save_uploaded_file = AsyncMock(return_value="/uploads/test.mp4")
+        mocked_services.storage.generate_unique_filename.return_value = "test.mp4"
+        
+        response = await aclient.post(
+            "/api/upload",
+            files={"video_file": ("test.mp4", io.BytesIO(b"fake video content"), "video/mp4")},
+            data=_UPLOAD_FORM
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert "video_id" in data
+        assert data["status"] == "pending"
+        
+        mocked_services.enqueue.assert_awaited_once()
+        task, task_id = mocked_services.enqueue.await_args.args
+        assert task is process_video_task
+        assert _routed_queue(task) == "celery"
+        assert mocked_services.enqueue.await_args.kwargs["video_id"] == data["video_id"]
+        assert mocked_services.enqueue.await_args.kwargs["video_path"] == "/uploads/test.mp4"
+        # The id the task runs under is the one stored for status polling
+        assert mock_collection.insert_one.await_args.args[0]["celery_task_id"] == task_id
     
-    def test_upload_with_url(self, mock_database):
+    async def test_upload_with_url(self, aclient, mock_database, mocked_services, monkeypatch):
         """Test upload with video URL"""
         mock_db, mock_collection = mock_database
         mock_collection.insert_one = AsyncMock()
         mock_collection.update_one = AsyncMock()
+        monkeypatch.setattr(settings, "debug", False)
         
         # Mock URL download
-        with patch('app.services.storage.storage_service') as mock_storage:
-            mock_storage.download_video_from_url = AsyncMock(return_value="/uploads/test.mp4")
-            mock_storage.generate_unique_filename.return_value = "test.mp4"
-            
-            # Mock Celery task
-            with patch('app.tasks.worker.process_video_task') as mock_task:
-                mock_task.delay.return_value = Mock(id="task-123")
-                
-                response = client.post(
-                    "/api/upload",
-                    data={
-                        "video_url": "https://example.com/video.mp4",
-                        "font_type": "Arial",
-                        "font_size": "24",
-                        "font_color": "#FFFFFF",
-                        "stroke_color": "#000000",
-                        "stroke_width": "2",
-                        "padding": "10",
-                        "position": "bottom"
-                    }
-                )
-                assert response.status_code == 200
-                data = response.json()
-                assert "video_id" in data
-                assert data["status"] == "pending"
+        mocked_services.storage.download_video_from_url = AsyncMock(return_value="/uploads/test.mp4")
+        mocked_services.storage.generate_unique_filename.return_value = "test.mp4"
+        
+        response = await aclient.post(
+            "/api/upload",
+            data={**_UPLOAD_FORM, "video_url": "https://example.com/video.mp4"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert "video_id" in data
+        assert data["status"] == "pending"
+        
+        mocked_services.enqueue.assert_awaited_once()
+        assert mocked_services.enqueue.await_args.args[0] is process_video_task
+        assert mocked_services.enqueue.await_args.kwargs["video_path"] == "/uploads/test.mp4"
+    
+    async def test_upload_batch_concurrent(self, aclient, mock_database, mocked_services):
+        """Test many uploads arriving together are handled concurrently"""
+        mock_db, mock_collection = mock_database
+        mock_collection.insert_one = AsyncMock()
+        mocked_services.storage.generate_unique_filename.return_value = "test.mp4"
+        
+        # Every save holds until all 16 are in flight, which only happens if uploads overlap
+        in_flight = 0
+        all_in_flight = asyncio.Event()
+        
+        async def save_uploaded_file(source, filename):
+            nonlocal in_flight
+            in_flight += 1
+            if in_flight == 16:
+                all_in_flight.set()
+            await all_in_flight.wait()
+            return "/uploads/test.mp4"
+        
+        mocked_services.storage.save_uploaded_file = save_uploaded_file
+        
+        # The timeout only turns a serialized (deadlocked) batch into a failure
+        responses = await asyncio.wait_for(asyncio.gather(*[
+            aclient.post(
+                "/api/upload",
+                files={"video_file": ("test.mp4", io.BytesIO(b"fake video content"), "video/mp4")},
+                data=_UPLOAD_FORM
+            )
+            for _ in range(16)
+        ]), timeout=10)
+        
+        assert all(response.status_code == 200 for response in responses)
+        assert len({response.json()["video_id"] for response in responses}) == 16
+        assert mock_collection.insert_one.await_count == 16
+        assert mocked_services.process.call_count == 16
 
 class TestVideoManagement:
     """Test video management endpoints"""
     
-    def test_get_videos_empty(self, mock_database):
+    async def test_get_videos_empty(self, aclient, mock_database):
         """Test getting videos when none exist"""
         mock_db, mock_collection = mock_database
-        mock_collection.count_documents = AsyncMock(return_value=0)
-        mock_collection.find.return_value.to_list = AsyncMock(return_value=[])
+        mock_collection.estimated_document_count = _areturn(0)
+        mock_collection.find = Mock(return_value=_cursor([]))
         
-        response = client.get("/api/videos")
+        response = await aclient.get("/api/videos")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 0
         assert len(data["videos"]) == 0
     
-    def test_get_videos_with_data(self, mock_database, sample_video_data):
+    async def test_get_videos_with_data(self, aclient, mock_database, sample_video_data):
         """Test getting videos with data"""
         mock_db, mock_collection = mock_database
-        mock_collection.count_documents = AsyncMock(return_value=1)
-        mock_collection.find.return_value.to_list = AsyncMock(return_value=[sample_video_data])
+        mock_collection.estimated_document_count = _areturn(1)
+        mock_collection.find = Mock(return_value=_cursor([sample_video_data]))
         
-        response = client.get("/api/videos")
+        response = await aclient.get("/api/videos")
         assert response.status_code == 200
         data = response.json()
         assert data["total"] == 1
         assert len(data["videos"]) == 1
         assert data["videos"][0]["video_id"] == "test-video-123"
     
-    def test_get_video_details(self, mock_database, sample_video_data):
+    async def test_get_video_details(self, aclient, mock_database, sample_video_data):
         """Test getting video details"""
         mock_db, mock_collection = mock_database
-        mock_collection.find_one = AsyncMock(return_value=sample_video_data)
+        mock_collection.find_one = _areturn(sample_video_data)
         
-        response = client.get("/api/video/test-video-123")
+        response = await aclient.get("/api/video/test-video-123")
         assert response.status_code == 200
         data = response.json()
         assert data["video_id"] == "test-video-123"
         assert data["filename"] == "test-video.mp4"
     
-    def test_get_video_not_found(self, mock_database):
+    async def test_get_video_not_found(self, aclient, mock_database):
         """Test getting non-existent video"""
         mock_db, mock_collection = mock_database
-        mock_collection.find_one = AsyncMock(return_value=None)
+        mock_collection.find_one = _areturn(None)
         
-        response = client.get("/api/video/non-existent")
+        response = await aclient.get("/api/video/non-existent")
         assert response.status_code == 404
         assert "Video not found" in response.json()["detail"]
     
-    def test_delete_video(self, mock_database):
+    async def test_video_status_wait_returns_on_completion(self, aclient, mock_database):
+        """Test long-polled status returns once local processing finishes"""
+        mock_db, mock_collection = mock_database
+        video = {"video_id": "test-video-123", "status": "processing", "updated_at": "2023-01-01T00:05:00Z"}
+        mock_collection.find_one = AsyncMock(side_effect=[
+            video,
+            video,
+            {**video, "status": "completed"},
+        ])
+        
+        with patch('app.api.routes.STATUS_POLL_INTERVAL', 0):
+            response = await aclient.get("/api/video/test-video-123/status?wait=true")
+        
+        assert response.status_code == 200
+        assert response.json()["status"] == "completed"
+        assert mock_collection.find_one.await_count == 3
+    
+    async def test_video_status_wait_polls_task_state(self, aclient, mock_database):
+        """Test long-polled status reads the task state per tick instead of blocking on the result"""
+        mock_db, mock_collection = mock_database
+        video = {"video_id": "test-video-123", "status": "processing", "celery_task_id": "task-123",
+                 "updated_at": "2023-01-01T00:05:00Z"}
+        mock_collection.find_one = AsyncMock(side_effect=[video, {**video, "status": "completed"}])
+        task_states = [
+            {"status": "processing", "progress": 40, "current_step": "transcribing"},
+            {"status": "completed", "progress": 100, "current_step": "completed"},
+        ]
+        
+        with patch('app.api.routes.USE_EAGER', False), \
+             patch('app.api.routes.STATUS_POLL_INTERVAL', 0), \
+             patch('app.api.routes.get_task_status', side_effect=task_states + task_states[-1:]) as mock_status:
+            response = await aclient.get("/api/video/test-video-123/status?wait=true")
+        
+        assert response.status_code == 200
+        assert response.json()["status"] == "completed"
+        assert response.json()["progress_percentage"] == 100
+        assert mock_status.call_count == 3
+    
+    async def test_concurrent_video_status_polls(self, aclient, mock_database):
+        """Test many simultaneous status polls aren't serialized by blocking calls"""
+        mock_db, mock_collection = mock_database
+        mock_collection.find_one = _areturn({
+            "video_id": "test-video-123",
+            "status": "processing",
+            "celery_task_id": "task-123",
+            "updated_at": "2023-01-01T00:05:00Z"
+        })
+        task_status = {"status": "processing", "progress": 40, "current_step": "transcribing"}
+        # Each lookup waits for a second one to arrive: lookups blocking the loop one at a
+        # time would break the barrier (and fail the requests) instead of pairing up
+        pair_up = threading.Barrier(2, timeout=10)
+        
+        def lookup(task_id, use_cache=True):
+            pair_up.wait()
+            return task_status
+        
+        with patch('app.api.routes.get_task_status', side_effect=lookup) as mock_status:
+            responses = await asyncio.gather(*[
+                aclient.get("/api/video/test-video-123/status") for _ in range(100)
+            ])
+        
+        assert all(response.status_code == 200 for response in responses)
+        assert all(response.json()["progress_percentage"] == 40 for response in responses)
+        assert mock_status.call_count == 100
+    
+    async def test_download_accel_redirect(self, aclient, mock_database, tmp_path, monkeypatch):
+        """Test X-Accel downloads escape the filename and stay inside the storage directory"""
+        mock_db, mock_collection = mock_database
+        video_file = tmp_path / "video.mp4"
+        video_file.write_bytes(b"video")
+        outside_file = tmp_path.parent / f"{tmp_path.name}-outside.mp4"
+        outside_file.write_bytes(b"video")
+        monkeypatch.setattr(settings, "accel_redirect_prefix", "/protected")
+        monkeypatch.setattr(settings, "upload_dir", str(tmp_path))
+        
+        mock_collection.find_one = _areturn({"filename": 'clip "1"\r\nfoo é.mp4', "original_path": str(video_file)})
+        response = await aclient.get("/api/video/test-video-123/download?type=original")
+        assert response.status_code == 200
+        assert response.headers["x-accel-redirect"] == "/protected/original/video.mp4"
+        assert response.headers["content-disposition"] == (
+            "attachment; filename=\"clip _1___foo _.mp4\"; "
+            "filename*=UTF-8''clip%20%221%22%0D%0Afoo%20%C3%A9.mp4"
+        )
+        
+        mock_collection.find_one = _areturn({"filename": "x.mp4", "original_path": str(outside_file)})
+        response = await aclient.get("/api/video/test-video-123/download?type=original")
+        assert response.status_code == 403
+        assert "x-accel-redirect" not in response.headers
+    
+    @patch('app.api.routes.storage_service')
+    async def test_delete_video(self, mock_storage, aclient, mock_database):
         """Test deleting video"""
         mock_db, mock_collection = mock_database
-        mock_collection.find_one = AsyncMock(return_value={
+        mock_collection.find_one = _areturn({
             "video_id": "test-video-123",
             "original_path": "/uploads/test.mp4",
             "processed_path": "/processed/test.mp4"
@@ -256,66 +416,68 @@ class TestVideoManagement:
         mock_collection.delete_one = AsyncMock()
         
         # Mock file deletion
-        with patch('app.services.storage.storage_service') as mock_storage:
-            mock_storage.delete_file.return_value = True
-            
-            response = client.delete("/api/video/test-video-123")
-            assert response.status_code == 200
-            assert "deleted successfully" in response.json()["message"]
+        mock_storage.delete_file = AsyncMock(return_value=True)
+        
+        response = await aclient.delete("/api/video/test-video-123")
+        assert response.status_code == 200
+        assert "deleted successfully" in response.json()["message"]
+        assert mock_storage.delete_file.await_count == 2
 
 class TestCaptionProcessing:
     """Test caption processing functionality"""
     
-    def test_create_captions(self, mock_database):
+    async def test_create_captions(self, aclient, mock_database, mocked_services, monkeypatch):
         """Test creating captions for existing video"""
         mock_db, mock_collection = mock_database
-        mock_collection.find_one = AsyncMock(return_value={
+        mock_collection.find_one = _areturn({
             "video_id": "test-video-123",
             "status": "completed",
             "original_path": "/uploads/test.mp4"
         })
         mock_collection.update_one = AsyncMock()
+        monkeypatch.setattr(settings, "debug", False)
         
-        # Mock Celery task
-        with patch('app.tasks.worker.process_video_task') as mock_task:
-            mock_task.delay.return_value = Mock(id="task-123")
-            
-            response = client.post(
-                "/api/caption",
-                json={
-                    "video_id": "test-video-123",
-                    "caption_style": {
-                        "font_type": "Arial",
-                        "font_size": 24,
-                        "font_color": "#FFFFFF",
-                        "stroke_color": "#000000",
-                        "stroke_width": 2,
-                        "padding": 10,
-                        "position": "bottom"
-                    }
+        response = await aclient.post(
+            "/api/caption",
+            json={
+                "video_id": "test-video-123",
+                "caption_style": {
+                    "font_type": "Arial",
+                    "font_size": 24,
+                    "font_color": "#FFFFFF",
+                    "stroke_color": "#000000",
+                    "stroke_width": 2,
+                    "padding": 10,
+                    "position": "bottom"
                 }
-            )
-            assert response.status_code == 200
-            data = response.json()
-            assert data["video_id"] == "test-video-123"
-            assert data["status"] == "processing"
+            }
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data["video_id"] == "test-video-123"
+        assert data["status"] == "processing"
+        
+        mocked_services.enqueue.assert_awaited_once()
+        task, task_id = mocked_services.enqueue.await_args.args
+        assert task is process_video_task
+        assert _routed_queue(task) == "celery"
+        assert mocked_services.enqueue.await_args.kwargs["video_path"] == "/uploads/test.mp4"
+        assert mock_collection.update_one.await_args.args[1]["$set"]["celery_task_id"] == task_id
 
 class TestServices:
     """Test service classes"""
     
-    def test_storage_service(self):
+    def test_storage_service(self, storage, tmp_path):
         """Test storage service functionality"""
-        storage = StorageService()
-        
         # Test filename generation
         filename = storage.generate_unique_filename("test.mp4")
         assert filename.endswith(".mp4")
         assert "test" in filename
         
-        # Test directory creation
-        storage.ensure_directory_exists("./test_dir")
-        assert os.path.exists("./test_dir")
-        os.rmdir("./test_dir")
+        # Test directory creation (under tmp_path, so parallel workers can't collide)
+        test_dir = tmp_path / "test_dir"
+        storage.ensure_directory_exists(str(test_dir))
+        assert test_dir.is_dir()
     
     def test_caption_style_validation(self):
         """Test caption style validation"""
@@ -331,115 +493,92 @@ class TestServices:
         )
         assert style.font_size == 24
         assert style.font_color == "#FFFFFF"
-        
-        # Invalid font size
-        with pytest.raises(ValueError):
-            CaptionStyle(font_size=100)  # Too large
-        
-        # Invalid stroke width
+    
+    @pytest.mark.parametrize("kwargs", [
+        {"font_size": 100},  # Too large
+        {"font_size": 0},  # Too small
+        {"stroke_width": 15},  # Too large
+        {"padding": -1},  # Negative
+    ])
+    def test_caption_style_rejects_out_of_range(self, kwargs):
+        """Test caption style bounds validation"""
         with pytest.raises(ValueError):
-            CaptionStyle(stroke_width=15)  # Too large
+            CaptionStyle(**kwargs)
 
 class TestErrorHandling:
     """Test error handling"""
     
-    def test_invalid_video_format(self):
-        """Test handling of invalid video format"""
-        with tempfile.NamedTemporaryFile(suffix=".txt") as temp_file:
-            temp_file.write(b"not a video")
-            temp_file.flush()
-            
-            with open(temp_file.name, "rb") as f:
-                response = client.post(
-                    "/api/upload",
-                    files={"video_file": ("test.txt", f, "text/plain")},
-                    data={"font_type": "Arial"}
-                )
-                assert response.status_code == 400
-    
-    def test_missing_required_fields(self):
+    async def test_missing_required_fields(self, aclient):
         """Test handling of missing required fields"""
-        response = client.post("/api/upload", data={})
+        response = await aclient.post("/api/upload", data={})
         assert response.status_code == 422  # Validation error
     
-    def test_database_connection_error(self):
+    async def test_database_connection_error(self, aclient, mock_database):
         """Test handling of database connection errors"""
-        with patch('app.api.dependencies.database') as mock_db:
-            mock_db.get_collection.side_effect = Exception("Database connection failed")
-            
-            response = client.get("/api/videos")
-            assert response.status_code == 500
+        mock_db, mock_collection = mock_database
+        mock_db.get_collection.side_effect = Exception("Database connection failed")
+        
+        response = await aclient.get("/api/videos")
+        assert response.status_code == 500
 
 # Integration tests
 class TestIntegration:
     """Integration tests"""
 
-    @pytest.mark.asyncio
-    async def test_full_workflow(self, mock_database):
+    async def test_full_workflow(self, aclient, mock_database, mocked_services, monkeypatch):
         """Test complete video processing workflow"""
         mock_db, mock_collection = mock_database
+        # Processing goes through the broker, as outside debug mode
+        monkeypatch.setattr(settings, "debug", False)
         
         # Mock all database operations
         mock_collection.insert_one = AsyncMock()
         mock_collection.update_one = AsyncMock()
-        mock_collection.find_one = AsyncMock(return_value={
+        mock_collection.find_one = _areturn({
             "video_id": "test-123",
             "status": "processing",
-            "original_path": "/uploads/test.mp4"
+            "original_path": "/uploads/test.mp4",
+            "updated_at": "2023-01-01T00:05:00Z"
         })
         
         # Mock file operations
-        with patch('app.services.storage.storage_service') as mock_storage:
-            mock_storage.save_uploaded_file = AsyncMock(return_value="/uploads/test.mp4")
-            mock_storage.generate_unique_filename.return_value = "test.mp4"
+        mocked_services.storage.save_uploaded_file = AsyncMock(return_value="/uploads/test.mp4")
+        mocked_services.storage.generate_unique_filename.return_value = "test.mp4"
+        
+        # Video processing and transcription belong to the worker, resolved on the routes module in one patch
+        with patch.multiple(
+            'app.api.routes',
+            video_processor=DEFAULT,
+            transcription_service=DEFAULT
+        ) as mocks:
+            # Upload video
+            upload_response = await aclient.post(
+                "/api/upload",
+                files={"video_file": ("test.mp4", io.BytesIO(b"fake video content"), "video/mp4")},
+                data={"font_type": "Arial"}
+            )
+            assert upload_response.status_code == 200
             
-            # Mock video processing
-            with patch('app.services.video_processor.video_processor') as mock_processor:
-                mock_processor.extract_audio.return_value = "/processed/test.wav"
-                mock_processor.get_video_metadata.return_value = {
-                    "duration": 120,
-                    "width": 1920,
-                    "height": 1080,
-                    "fps": 30,
-                    "format": "mp4",
-                    "size_bytes": 1024000
-                }
-                mock_processor.create_captioned_video.return_value = "/processed/test-captioned.mp4"
-                
-                # Mock transcription
-                with patch('app.services.transcription.transcription_service') as mock_transcription:
-                    from app.models.schemas import CaptionSegment
-                    mock_transcription.transcribe_audio = AsyncMock(return_value=[
-                        CaptionSegment(
-                            start_time=0.0,
-                            end_time=5.0,
-                            text="Hello world",
-                            confidence=0.95
-                        )
-                    ])
-                    
-                    # Mock Celery task
-                    with patch('app.tasks.worker.process_video_task') as mock_task:
-                        mock_task.delay.return_value = Mock(id="task-123")
-                        
-                        # Upload video
-                        with tempfile.NamedTemporaryFile(suffix=".mp4") as temp_file:
-                            temp_file.write(b"fake video content")
-                            temp_file.flush()
-                            
-                            with open(temp_file.name, "rb") as f:
-                                upload_response = client.post(
-                                    "/api/upload",
-                                    files={"video_file": ("test.mp4", f, "video/mp4")},
-                                    data={"font_type": "Arial"}
-                                )
-                                assert upload_response.status_code == 200
-                                
-                                video_id = upload_response.json()["video_id"]
-                                
-                                # Check video status
-                                status_response = client.get(f"/api/video/{video_id}/status")
-                                assert status_response.status_code == 200
+            video_id = upload_response.json()["video_id"]
+            
+            # The upload queued the pipeline instead of processing in the API process
+            mocked_services.enqueue.assert_awaited_once()
+            task, task_id = mocked_services.enqueue.await_args.args
+            assert task is process_video_task
+            assert _routed_queue(task) == "celery"
+            assert mocked_services.enqueue.await_args.kwargs["video_id"] == video_id
+            assert mocked_services.enqueue.await_args.kwargs["caption_style"]["font_type"] == "Arial"
+            assert mock_collection.insert_one.await_args.args[0]["celery_task_id"] == task_id
+            assert not mocks["video_processor"].method_calls
+            assert not mocks["transcription_service"].method_calls
+            
+            # Poll video status, several clients at once
+            status_responses = await asyncio.gather(*[
+                aclient.get(f"/api/video/{video_id}/status") for _ in range(4)
+            ])
+            for status_response in status_responses:
+                assert status_response.status_code == 200
+                assert status_response.json()["status"] == "processing"
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
\ No newline at end of file
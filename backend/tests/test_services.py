@@ -9,25 +9,25 @@ from unittest.mock import Mock, patch, AsyncMock
 from PIL import Image
 import numpy as np
 
-from app.services.storage import StorageService
+from app.core.config import settings
 from app.services.transcription import TranscriptionService
 from app.services.caption_renderer import CaptionRenderer
 from app.services.video_processor import VideoProcessor
-from app.models.schemas import CaptionSegment, CaptionStyle
+from app.services.progress import ProgressBatcher
+from app.models.schemas import CaptionSegment, CaptionStyle, CaptionWord
 
 class TestStorageService:
     """Test storage service functionality"""
     
-    def setup_method(self):
-        """Setup test environment"""
-        self.storage = StorageService()
-        self.test_dir = tempfile.mkdtemp()
-    
-    def teardown_method(self):
-        """Cleanup test environment"""
-        import shutil
-        if os.path.exists(self.test_dir):
-            shutil.rmtree(self.test_dir)
+    @pytest.fixture(autouse=True)
+    def setup_storage(self, storage, tmp_path, monkeypatch):
+        """Point the session StorageService at this test's tmp_path; pytest prunes those in bulk"""
+        monkeypatch.setattr(storage, "upload_dir", tmp_path)
+        monkeypatch.setattr(storage, "processed_dir", tmp_path)
+        # A free-space reading cached by an earlier test must not answer this one
+        monkeypatch.setattr(storage, "_space_cache", (0.0, 0))
+        self.storage = storage
+        self.test_dir = str(tmp_path)
     
     def test_generate_unique_filename(self):
         """Test unique filename generation"""
@@ -58,7 +58,7 @@ class TestStorageService:
         hash2 = self.storage.get_file_hash(test_file)
         
         assert hash1 == hash2
-        assert len(hash1) == 32  # MD5 hash length
+        assert len(hash1) == 32  # Truncated SHA-256 hex digest
         
         # Different content should produce different hash
         with open(test_file, "w") as f:
@@ -67,7 +67,35 @@ class TestStorageService:
         hash3 = self.storage.get_file_hash(test_file)
         assert hash1 != hash3
     
-    def test_get_file_size(self):
+    def test_get_file_size_and_hash(self):
+        """Test size and hash come back together from one pass"""
+        test_file = os.path.join(self.test_dir, "test.txt")
+        with open(test_file, "wb") as f:
+            f.write(b"test content")
+        
+        size, file_hash = self.storage.get_file_size_and_hash(test_file)
+        
+        assert size == len(b"test content")
+        assert file_hash == self.storage.get_file_hash(test_file)
+    
+    def test_get_file_fingerprint(self):
+        """Test fingerprints follow the sampled content and size"""
+        paths = [os.path.join(self.test_dir, f"file{i}.bin") for i in range(3)]
+        middle = b"x" * (512 * 1024)
+        with open(paths[0], "wb") as f:
+            f.write(b"head" + middle + b"tail")
+        with open(paths[1], "wb") as f:
+            f.write(b"head" + middle + b"tail")
+        with open(paths[2], "wb") as f:
+            f.write(b"head" + middle + b"TAIL")
+        
+        fingerprints = [self.storage.get_file_fingerprint(path) for path in paths]
+        
+        assert fingerprints[0] == fingerprints[1]
+        assert fingerprints[0] != fingerprints[2]
+        assert len(fingerprints[0]) == 32
+    
+    async def test_get_file_size(self):
         """Test file size calculation"""
         test_file = os.path.join(self.test_dir, "test.txt")
         content = "test content"
@@ -75,10 +103,18 @@ class TestStorageService:
         with open(test_file, "w") as f:
             f.write(content)
         
-        size = self.storage.get_file_size(test_file)
+        size = await self.storage.get_file_size(test_file)
         assert size == len(content.encode('utf-8'))
     
-    def test_delete_file(self):
+    def test_get_available_space(self):
+        """Test free space is read once and reused within the TTL"""
+        with patch("app.services.storage.shutil.disk_usage") as mock_usage:
+            mock_usage.return_value = Mock(free=1024)
+            assert self.storage.get_available_space() == 1024
+            assert self.storage.get_available_space() == 1024
+            assert mock_usage.call_count == 1
+    
+    async def test_delete_file(self):
         """Test file deletion"""
         test_file = os.path.join(self.test_dir, "test.txt")
         
@@ -89,13 +125,98 @@ class TestStorageService:
         assert os.path.exists(test_file)
         
         # Delete file
-        result = self.storage.delete_file(test_file)
+        result = await self.storage.delete_file(test_file)
         assert result is True
         assert not os.path.exists(test_file)
         
         # Try to delete non-existent file
-        result = self.storage.delete_file("non_existent.txt")
+        result = await self.storage.delete_file("non_existent.txt")
         assert result is False
+        
+        # Sync variant behaves the same
+        with open(test_file, "w") as f:
+            f.write("test content")
+        assert self.storage.delete_file_sync(test_file) is True
+        assert self.storage.delete_file_sync(test_file) is False
+
+    async def test_save_uploaded_stream(self):
+        """Test streaming upload chunks to disk"""
+        async def chunks():
+            yield b"first "
+            yield b"second"
+
+        file_path = await self.storage.save_uploaded_file(chunks(), "stream.mp4")
+        with open(file_path, "rb") as f:
+            assert f.read() == b"first second"
+
+        # A failing stream should not leave a partial file behind
+        async def failing_chunks():
+            yield b"partial"
+            raise ValueError("client disconnected")
+
+        with pytest.raises(ValueError):
+            await self.storage.save_uploaded_file(failing_chunks(), "broken.mp4")
+        assert not os.path.exists(os.path.join(self.test_dir, "broken.mp4"))
+
+    async def test_save_uploaded_fileobj(self):
+        """Test copying spooled uploads from memory and from disk"""
+        in_memory = tempfile.SpooledTemporaryFile(max_size=1024)
+        in_memory.write(b"small upload")
+        file_path = await self.storage.save_uploaded_file(in_memory, "small.mp4")
+        with open(file_path, "rb") as f:
+            assert f.read() == b"small upload"
+
+        on_disk = tempfile.SpooledTemporaryFile(max_size=4)
+        on_disk.write(b"rolled over to disk")
+        file_path = await self.storage.save_uploaded_file(on_disk, "large.mp4")
+        with open(file_path, "rb") as f:
+            assert f.read() == b"rolled over to disk"
+
+    async def test_download_video_from_url(self):
+        """Test URL downloads are written to disk and cleaned up on failure"""
+        import httpx
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request)
+            if request.url.path == "/missing.mp4":
+                return httpx.Response(404)
+            return httpx.Response(200, content=b"video bytes" * 1000)
+
+        transport = httpx.MockTransport(handler)
+        real_client = httpx.AsyncClient
+        with patch("app.services.storage.httpx.AsyncClient",
+                   lambda **kwargs: real_client(transport=transport, **kwargs)):
+            file_path = await self.storage.download_video_from_url("http://test/video.mp4", "url.mp4")
+            with open(file_path, "rb") as f:
+                assert f.read() == b"video bytes" * 1000
+            assert requests_seen[0].headers["accept-encoding"] == "identity"
+
+            with pytest.raises(httpx.HTTPStatusError):
+                await self.storage.download_video_from_url("http://test/missing.mp4", "missing.mp4")
+            assert not os.path.exists(os.path.join(self.test_dir, "missing.mp4"))
+
+    async def test_save_uploaded_file_sources(self):
+        """Test saving from bytes, file objects and chunk iterators"""
+        import io
+
+        async def chunks():
+            yield b"streamed "
+            yield b"content"
+
+        sources = {
+            "bytes.mp4": (b"raw content", b"raw content"),
+            "fileobj.mp4": (io.BytesIO(b"file content"), b"file content"),
+            "chunks.mp4": (chunks(), b"streamed content"),
+        }
+        for filename, (source, expected) in sources.items():
+            file_path = await self.storage.save_uploaded_file(source, filename)
+            with open(file_path, "rb") as f:
+                assert f.read() == expected
+
+        file_path = await self.storage.save_processed_video(io.BytesIO(b"processed"), "out.mp4")
+        with open(file_path, "rb") as f:
+            assert f.read() == b"processed"
 
 class TestCaptionRenderer:
     """Test caption renderer functionality"""
@@ -118,6 +239,7 @@ class TestCaptionRenderer:
         
         # Test invalid hex (should return white as fallback)
         assert self.renderer._hex_to_rgb("invalid") == (255, 255, 255)
+        assert self.renderer._hex_to_rgb("#FFFF") == (255, 255, 255)
     
     def test_text_wrapping(self):
         """Test text wrapping functionality"""
@@ -134,6 +256,52 @@ class TestCaptionRenderer:
         assert len(wrapped) > 1
         assert all(len(line) > 0 for line in wrapped)
     
+    def test_fonts_shared_across_renderers(self):
+        """Test a font file is parsed once per size, not once per renderer"""
+        from PIL import ImageFont
+        
+        first = self.renderer._load_font("Arial", 24)
+        if not isinstance(first, ImageFont.FreeTypeFont):
+            pytest.skip("No TrueType font available")
+        second = CaptionRenderer()._load_font("Arial", 24)
+        
+        assert first is second
+    
+    def test_font_cache_is_bounded(self):
+        """Test the font cache evicts old fonts and the glyph masks keyed by them"""
+        with patch('app.services.caption_renderer.FONT_CACHE_SIZE', 2):
+            first = self.renderer._load_font("Arial", 20)
+            self.renderer._glyph_mask("Hi", first)
+            self.renderer._load_font("Arial", 22)
+            self.renderer._load_font("Arial", 24)
+        
+        assert list(self.renderer.font_cache) == [("Arial", 22), ("Arial", 24)]
+        assert all(key[0] != id(first) for key in self.renderer._mask_cache)
+    
+    def test_font_path_cache_is_bounded(self):
+        """Test font path lookups are memoized per name and evicted like fonts"""
+        with patch('app.services.caption_renderer.FONT_CACHE_SIZE', 2), \
+             patch.object(self.renderer, '_find_font_path', return_value=None) as find:
+            for name in ("FontA", "fonta", "FontB", "FontC"):
+                self.renderer._load_font(name, 20)
+        
+        assert find.call_count == 3
+        assert list(self.renderer._font_path_cache) == ["fontb", "fontc"]
+    
+    def test_font_index(self, tmp_path):
+        """Test font lookups go through the one-time font index"""
+        font_dir = str(tmp_path)
+        os.makedirs(os.path.join(font_dir, "nested"))
+        for name in ("nested/MyFont-Bold.ttf", "nested/MyFont.ttf", "notes.txt"):
+            open(os.path.join(font_dir, name), "w").close()
+        
+        with patch("app.services.caption_renderer.FONT_DIRS", [font_dir]):
+            renderer = CaptionRenderer()
+            assert renderer._find_font_path("myfont") == os.path.join(font_dir, "nested", "MyFont.ttf")
+            assert renderer._find_font_path("bold") == os.path.join(font_dir, "nested", "MyFont-Bold.ttf")
+            assert renderer._find_font_path("missing") is None
+            assert len(renderer._font_index) == 2
+    
     def test_caption_image_creation(self):
         """Test caption image creation"""
         style = CaptionStyle(
@@ -158,6 +326,38 @@ class TestCaptionRenderer:
         assert caption_img.size[0] == 1920  # width
         assert caption_img.size[1] > 0  # height
     
+    def test_caption_stroke_rendering(self):
+        """Test stroke outline is drawn around the text"""
+        style = CaptionStyle(font_color="#FFFFFF", stroke_color="#000000", stroke_width=3)
+        
+        caption_img = self.renderer.create_caption_image("Stroke", 640, 360, style)
+        pixels = np.asarray(caption_img)
+        opaque = pixels[..., 3] == 255
+        
+        # Both fill and stroke colors should be present
+        assert (pixels[opaque][:, :3] == 255).all(axis=1).any()
+        assert (pixels[opaque][:, :3] == 0).all(axis=1).any()
+        
+        # Without a stroke the text covers fewer pixels
+        style.stroke_width = 0
+        plain_img = self.renderer.create_caption_image("Stroke", 640, 360, style)
+        assert (np.asarray(plain_img)[..., 3] > 0).sum() < (pixels[..., 3] > 0).sum()
+    
+    def test_caption_image_cache(self):
+        """Test repeated captions are served from the image cache"""
+        style = CaptionStyle()
+        
+        first = self.renderer.create_caption_image("Cached caption", 640, 360, style)
+        second = self.renderer.create_caption_image("Cached caption", 640, 360, style)
+        
+        assert len(self.renderer._image_cache) == 1
+        assert first is not second
+        assert first.tobytes() == second.tobytes()
+        
+        # Any style change that affects rendering is a different entry
+        self.renderer.create_caption_image("Cached caption", 640, 360, CaptionStyle(font_color="#FF0000"))
+        assert len(self.renderer._image_cache) == 2
+    
     def test_caption_position_calculation(self):
         """Test caption position calculation"""
         video_height = 1080
@@ -183,6 +383,16 @@ class TestVideoProcessor:
     def setup_method(self):
         """Setup test environment"""
         self.processor = VideoProcessor()
+        # Skip encoder detection so ffmpeg mocks only see the command under test
+        self.processor._h264_encoder = "libx264"
+    
+    def test_temp_dir_setting(self, tmp_path):
+        """Test scratch files go under the configured temp dir"""
+        with patch.object(settings, 'temp_dir', str(tmp_path)):
+            processor = VideoProcessor()
+        
+        assert processor.temp_dir == tmp_path / "reely_processing"
+        assert processor.temp_dir.is_dir()
     
     def test_caption_position_calculation(self):
         """Test caption position calculation"""
@@ -204,6 +414,182 @@ class TestVideoProcessor:
         expected_bottom = video_height - caption_height - padding
         assert y_pos == expected_bottom
     
+    async def test_get_video_metadata(self, tmp_path):
+        """Test ffprobe output is parsed into video metadata"""
+        import json
+        import subprocess
+        
+        probe = {
+            "streams": [
+                {"codec_type": "audio", "codec_name": "aac", "sample_rate": "44100"},
+                {"codec_type": "video", "width": 1920, "height": 1080, "avg_frame_rate": "30000/1001"}
+            ],
+            "format": {"duration": "12.500000"}
+        }
+        completed = subprocess.CompletedProcess([], 0, stdout=json.dumps(probe).encode(), stderr=b"")
+        
+        video_path = tmp_path / "video.mp4"
+        video_path.write_bytes(b"video")
+        with patch.object(self.processor, '_run_ffmpeg', AsyncMock(return_value=completed)) as mock_run:
+            metadata = await self.processor.get_video_metadata(str(video_path))
+        
+        assert mock_run.call_args.args[0] == "ffprobe"
+        assert metadata["duration"] == 12.5
+        assert (metadata["width"], metadata["height"]) == (1920, 1080)
+        assert metadata["fps"] == pytest.approx(29.97, abs=0.01)
+        assert metadata["format"] == ".mp4"
+        assert metadata["size_bytes"] == 5
+        assert metadata["audio_codec"] == "aac"
+    
+    async def test_get_video_metadata_probes_unchanged_file_once(self, tmp_path):
+        """Test repeat metadata lookups for the same file reuse the first probe"""
+        import json
+        import subprocess
+        
+        probe = {
+            "streams": [{"codec_type": "video", "width": 640, "height": 360, "avg_frame_rate": "25/1"}],
+            "format": {"duration": "3.0"}
+        }
+        completed = subprocess.CompletedProcess([], 0, stdout=json.dumps(probe).encode(), stderr=b"")
+        
+        video_path = tmp_path / "video.mp4"
+        video_path.write_bytes(b"video")
+        with patch.object(self.processor, '_run_ffmpeg', AsyncMock(return_value=completed)) as mock_run:
+            first = await self.processor.get_video_metadata(str(video_path))
+            second = await self.processor.get_video_metadata(str(video_path))
+        
+        assert mock_run.await_count == 1
+        assert first == second
+        assert first["size_bytes"] == 5
+    
+    def test_segments_to_ass(self):
+        """Test caption segments are written as an ASS script"""
+        segments = [
+            CaptionSegment(start_time=0.0, end_time=1.5, text="Hello world"),
+            CaptionSegment(start_time=3661.25, end_time=3662.0, text="{braces} \\ kept")
+        ]
+        style = CaptionStyle(font_color="#FF8000", stroke_color="#000000", position="top", padding=30)
+        
+        ass = self.processor._segments_to_ass(segments, style, 1920, 1080)
+        
+        assert "PlayResX: 1920\nPlayResY: 1080" in ass
+        assert "Style: Default,Arial,24,&H000080FF,&H000080FF,&H00000000," in ass
+        assert ",1,2,0,8,192,192,30,1\n" in ass
+        assert "Dialogue: 0,0:00:00.00,0:00:01.50,Default,,0,0,0,,Hello world" in ass
+        assert "Dialogue: 0,1:01:01.25,1:01:02.00,Default,,0,0,0,,\\{braces\\} \\\\ kept" in ass
+    
+    def test_ass_style_font_name_sanitized(self):
+        """Test a font name cannot break out of the ASS Style line"""
+        style = CaptionStyle(font_type="Evil,99\n[Events]\x00")
+        
+        header = self.processor._ass_header(style, 1920, 1080)
+        
+        assert "Style: Default,Evil99[Events],24," in header
+        assert header.count("[Events]\n") == 1
+        assert self.processor._ass_font_name(",\r\n") == "Arial"
+    
+    async def test_create_captioned_video_burns_ass(self):
+        """Test captions are burned in with one ffmpeg ass filter pass"""
+        segments = [CaptionSegment(start_time=0.0, end_time=1.0, text="Hi")]
+        metadata = {"width": 640, "height": 360, "audio_codec": "aac"}
+        
+        with patch.object(self.processor, 'get_video_metadata', AsyncMock(return_value=metadata)), \
+             patch.object(self.processor, '_run_ffmpeg', AsyncMock()) as mock_run:
+            await self.processor.create_captioned_video("in.mp4", segments, CaptionStyle(), "out.mp4")
+        
+        args = mock_run.call_args.args[1]
+        assert args[args.index("-vf") + 1].startswith("ass=")
+        assert args[args.index("-c:a") + 1] == "copy"
+        assert not list(self.processor.temp_dir.glob("*.ass"))
+    
+    def test_word_timing_uses_transcribed_words(self):
+        """Test transcriber word timestamps are preferred over an even split"""
+        segment = CaptionSegment(
+            start_time=0.0,
+            end_time=2.0,
+            text="Hello there",
+            words=[
+                CaptionWord(word="Hello", start=0.2, end=0.6),
+                CaptionWord(word="there", start=1.0, end=1.8)
+            ]
+        )
+        
+        word_timings = self.processor._split_segment_into_words(segment)
+        
+        assert [(t.word, t.start, t.end) for t in word_timings] == [
+            ("Hello", 0.2, 0.6), ("there", 1.0, 1.8)
+        ]
+        # Highlights run up to the next word's start
+        assert [t.duration_cs for t in word_timings] == [80, 80]
+    
+    def test_segments_to_karaoke_ass(self):
+        """Test word highlighting is written as ASS karaoke tags"""
+        segments = [CaptionSegment(start_time=0.0, end_time=1.0, text="one two three")]
+        
+        ass = self.processor._segments_to_karaoke_ass(segments, CaptionStyle(), 1280, 720, "#FFFF00")
+        
+        # Spoken words switch from the font colour (secondary) to the highlight (primary)
+        assert "Style: Default,Arial,24,&H0000FFFF,&H00FFFFFF," in ass
+        assert "0:00:00.00,0:00:01.00,Default,,0,0,0,,{\\k33}one {\\k34}two {\\k33}three" in ass
+    
+    async def test_process_video_single_pass(self):
+        """Test resize, compression and captions share one ffmpeg filtergraph"""
+        segments = [CaptionSegment(start_time=0.0, end_time=1.0, text="Hi")]
+        metadata = {"width": 3840, "height": 2160, "audio_codec": "vorbis"}
+        
+        with patch.object(self.processor, 'get_video_metadata', AsyncMock(return_value=metadata)), \
+             patch.object(self.processor, '_run_ffmpeg', AsyncMock()) as mock_run:
+            await self.processor.process_video(
+                "in.mp4", "out.mp4", max_width=1280, quality="low",
+                caption_segments=segments, caption_style=CaptionStyle()
+            )
+        
+        assert mock_run.call_count == 1
+        args = mock_run.call_args.args[1]
+        filtergraph = args[args.index("-vf") + 1]
+        assert filtergraph.startswith("scale=1280:720,ass=")
+        assert filtergraph.endswith(",format=yuv420p")
+        assert args[args.index("-b:v") + 1] == "500k"
+        # Vorbis can't be muxed into MP4, so it is re-encoded
+        assert args[args.index("-c:a") + 1] == "aac"
+    
+    async def test_resize_video_without_scaling_copies_video(self):
+        """Test a video already within max_width is not re-encoded"""
+        metadata = {"width": 640, "height": 360}
+        with patch.object(self.processor, 'get_video_metadata', AsyncMock(return_value=metadata)), \
+             patch.object(self.processor, '_run_ffmpeg', AsyncMock()) as mock_run:
+            await self.processor.resize_video("in.mp4", "out.mp4", max_width=1920)
+        
+        args = mock_run.call_args.args[1]
+        assert "-vf" not in args
+        assert args[args.index("-c:v") + 1] == "copy"
+    
+    async def test_detect_h264_encoder(self):
+        """Test the first listed hardware encoder that can encode is chosen"""
+        import subprocess
+        
+        listing = subprocess.CompletedProcess([], 0, stdout=b" V..... h264_nvenc\n V..... h264_qsv\n", stderr=b"")
+        
+        async def run_ffmpeg(binary, args, cwd=None):
+            if "-encoders" in args:
+                return listing
+            if "h264_nvenc" in args:
+                raise RuntimeError("No NVENC capable devices found")
+            return subprocess.CompletedProcess([], 0, stdout=b"", stderr=b"")
+        
+        with patch.object(self.processor, '_run_ffmpeg', side_effect=run_ffmpeg):
+            assert await self.processor._detect_h264_encoder() == "h264_qsv"
+    
+    async def test_create_thumbnail_clamps_timestamp(self):
+        """Test thumbnails seek within the video and come straight from ffmpeg"""
+        with patch.object(self.processor, 'get_video_metadata', AsyncMock(return_value={"duration": 2.0})), \
+             patch.object(self.processor, '_run_ffmpeg', AsyncMock()) as mock_run:
+            await self.processor.create_thumbnail("in.mp4", "thumb.jpg", timestamp=5.0)
+        
+        args = mock_run.call_args.args[1]
+        assert args[args.index("-ss") + 1] == "1.900"
+        assert args[-1] == "thumb.jpg"
+    
     def test_word_timing_split(self):
         """Test word timing split functionality"""
         segment = CaptionSegment(
@@ -216,17 +602,17 @@ class TestVideoProcessor:
         word_timings = self.processor._split_segment_into_words(segment)
         
         assert len(word_timings) == 3  # "Hello", "world", "test"
-        assert word_timings[0]["word"] == "Hello"
-        assert word_timings[1]["word"] == "world"
-        assert word_timings[2]["word"] == "test"
+        assert word_timings[0].word == "Hello"
+        assert word_timings[1].word == "world"
+        assert word_timings[2].word == "test"
         
         # Check timing
-        assert word_timings[0]["start"] == 0.0
-        assert word_timings[2]["end"] == 10.0
+        assert word_timings[0].start == 0.0
+        assert word_timings[2].end == 10.0
         
         # Check that timings are sequential
         for i in range(len(word_timings) - 1):
-            assert word_timings[i]["end"] <= word_timings[i + 1]["start"]
+            assert word_timings[i].end <= word_timings[i + 1].start
 
 class TestTranscriptionService:
     """Test transcription service functionality"""
@@ -239,6 +625,21 @@ class TestTranscriptionService:
             mock_load.return_value = mock_model
             self.service = TranscriptionService()
     
+    def test_model_shared_across_instances(self):
+        """Test a model is loaded once per process, not once per service instance"""
+        model = Mock()
+        with patch.dict(TranscriptionService._models, clear=True), \
+             patch.object(TranscriptionService, '_create_model', return_value=(model, "openai")) as mock_create:
+            first = TranscriptionService()
+            second = TranscriptionService()
+            first.load_model()
+            second.load_model()
+        
+        assert mock_create.call_count == 1
+        assert first.model is second.model is model
+        # The model isn't thread-safe, so inference is serialized across instances too
+        assert first.executor is second.executor
+    
     def test_model_info(self):
         """Test model information retrieval"""
         info = self.service.get_model_info()
@@ -279,6 +680,168 @@ class TestTranscriptionService:
         assert segments[1].end_time == 10.0
         assert segments[1].text == "How are you?"
         assert segments[1].confidence == -0.3
+    
+    def test_faster_whisper_result_shape(self):
+        """Test faster-whisper output is mapped to the openai-whisper result shape"""
+        word = Mock(word=" Hello", start=0.0, end=0.5, probability=0.9)
+        segment = Mock(start=0.0, end=1.0, text=" Hello", avg_logprob=-0.2, words=[word])
+        model = Mock()
+        model.transcribe.return_value = (iter([segment]), Mock(language="en"))
+        self.service.model = model
+        self.service.backend = "faster-whisper"
+        
+        result = self.service._run_model("audio.wav")
+        
+        assert result["language"] == "en"
+        assert result["segments"][0]["avg_logprob"] == -0.2
+        assert result["segments"][0]["words"][0] == {
+            "word": " Hello", "start": 0.0, "end": 0.5, "probability": 0.9
+        }
+        segments = self.service._convert_to_segments(result)
+        assert segments[0].text == "Hello"
+        assert segments[0].words[0].word == "Hello"
+        assert (segments[0].words[0].start, segments[0].words[0].end) == (0.0, 0.5)
+    
+    def test_load_audio_wav(self, tmp_path):
+        """Test 16 kHz mono WAVs are read directly as float32 samples"""
+        import wave
+        
+        samples = np.array([0, 16384, -32768], dtype=np.int16)
+        path = str(tmp_path / "audio.wav")
+        with wave.open(path, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(16000)
+            wav.writeframes(samples.tobytes())
+        
+        audio = self.service._load_audio(path)
+        
+        assert audio.dtype == np.float32
+        assert audio.tolist() == [0.0, 0.5, -1.0]
+    
+    def test_decode_audio_grows_buffer(self, tmp_path):
+        """Test ffmpeg output longer than the initial buffer is read in full"""
+        import io
+        
+        samples = np.arange(-50, 50, dtype=np.int16)
+        process = Mock(returncode=0, stdout=io.BytesIO(samples.tobytes()))
+        process.__enter__ = Mock(return_value=process)
+        process.__exit__ = Mock(return_value=False)
+        
+        video_path = tmp_path / "clip.mp4"
+        video_path.write_bytes(b"not a wav")
+        with patch('app.services.transcription.DECODE_BUFFER_SAMPLES', 16), \
+             patch('app.services.transcription.subprocess.Popen', return_value=process) as mock_popen:
+            audio = self.service._load_audio(str(video_path))
+        
+        assert mock_popen.call_args.args[0][0] == "ffmpeg"
+        assert audio.dtype == np.float32
+        assert audio.tolist() == (samples / 32768.0).astype(np.float32).tolist()
+    
+    async def test_transcription_cache_round_trip(self, tmp_path):
+        """Test transcriptions are cached by file fingerprint and model"""
+        segments = [CaptionSegment(start_time=0.0, end_time=1.0, text="Hi", words=[
+            CaptionWord(word="Hi", start=0.0, end=0.4)
+        ])]
+        
+        with patch.object(settings, 'processed_dir', str(tmp_path)):
+            audio_path = str(tmp_path / "audio.wav")
+            (tmp_path / "audio.wav").write_bytes(b"audio" * 1000)
+            
+            assert await self.service._get_cached_transcription(audio_path) is None
+            await self.service._cache_transcription(audio_path, segments)
+            assert await self.service._get_cached_transcription(audio_path) == segments
+            
+            # A different model does not reuse the entry
+            self.service.model_name = "small"
+            assert await self.service._get_cached_transcription(audio_path) is None
+            self.service._cache_db.close()
+    
+    def test_silent_audio_skips_model(self):
+        """Test audio with no detected speech never reaches the openai-whisper model"""
+        model = Mock()
+        self.service.model = model
+        self.service.backend = "openai"
+        
+        silence = np.zeros(16000 * 2, dtype=np.float32)
+        with patch.object(self.service, '_load_audio', return_value=silence):
+            result = self.service._run_model("audio.wav")
+        
+        assert result["segments"] == []
+        model.transcribe.assert_not_called()
+    
+    def test_batched_pipeline_batch_size(self):
+        """Test the batched faster-whisper pipeline receives the configured batch size"""
+        from faster_whisper import BatchedInferencePipeline
+        
+        model = Mock(spec=BatchedInferencePipeline)
+        model.transcribe.return_value = (iter([]), Mock(language="en"))
+        self.service.model = model
+        self.service.backend = "faster-whisper"
+        
+        self.service._run_model("audio.wav")
+        
+        assert model.transcribe.call_args.kwargs["batch_size"] == settings.whisper_batch_size
+
+class TestProgressBatcher:
+    """Test progress update batching"""
+    
+    async def test_updates_are_coalesced(self):
+        """Test repeated ticks for one document become a single write"""
+        batcher = ProgressBatcher(flush_interval=60)
+        collection = Mock()
+        collection.bulk_write = AsyncMock()
+        
+        await batcher.update_video_progress(collection, "video-1", 10, "extracting_audio")
+        await batcher.update_video_progress(collection, "video-1", 30, "transcribing_audio")
+        await batcher.update_video_progress(collection, "video-2", 10, "extracting_audio")
+        collection.bulk_write.assert_not_called()
+        
+        await batcher.flush()
+        
+        collection.bulk_write.assert_awaited_once()
+        operations = collection.bulk_write.call_args.args[0]
+        assert len(operations) == 2
+        assert operations[0]._filter == {"video_id": "video-1"}
+        assert operations[0]._doc["$set"]["progress_percentage"] == 30
+        assert operations[0]._doc["$set"]["current_step"] == "transcribing_audio"
+        batcher._flush_task.cancel()
+    
+    async def test_flushes_when_full(self):
+        """Test a full buffer is written without waiting for the timer"""
+        batcher = ProgressBatcher(max_pending=2, flush_interval=60)
+        collection = Mock()
+        collection.bulk_write = AsyncMock()
+        
+        await batcher.update_video_progress(collection, "video-1", 10, "extracting_audio")
+        await batcher.update_video_progress(collection, "video-2", 10, "extracting_audio")
+        
+        collection.bulk_write.assert_awaited_once()
+        batcher._flush_task.cancel()
+    
+    async def test_flush_waits_for_in_flight_write(self):
+        """Test an explicit flush returns only after a timer flush already writing has landed"""
+        batcher = ProgressBatcher(flush_interval=0)
+        writes = []
+        release = asyncio.Event()
+        
+        async def bulk_write(operations, ordered):
+            await release.wait()
+            writes.append(operations[0]._doc["$set"]["progress_percentage"])
+        
+        collection = Mock()
+        collection.bulk_write = bulk_write
+        
+        await batcher.update_video_progress(collection, "video-1", 80, "creating_captions")
+        await asyncio.sleep(0.01)  # the timer flush takes the tick and starts writing
+        final_flush = asyncio.create_task(batcher.flush())
+        await asyncio.sleep(0.01)
+        assert not final_flush.done()
+        
+        release.set()
+        await final_flush
+        writes.append(100)  # the final "completed" update_one
+        assert writes == [80, 100]
 
 class TestIntegration:
     """Integration tests for services"""
@@ -318,38 +881,27 @@ class TestIntegration:
         assert segment.text == "Hello world"
         assert segment.confidence == 0.95
     
-    @pytest.mark.asyncio
-    async def test_storage_operations(self):
+    async def test_storage_operations(self, storage, tmp_path):
         """Test async storage operations"""
-        storage = StorageService()
-        
-        # Test async file operations
         test_content = b"test file content"
-        filename = "test_async.txt"
+        file_path = str(tmp_path / "test_async.txt")
         
-        # This would normally be async, but we'll test the sync parts
-        file_path = os.path.join(tempfile.gettempdir(), filename)
+        async def chunks():
+            yield test_content[:5]
+            yield test_content[5:]
         
-        try:
-            # Test file operations
-            with open(file_path, 'wb') as f:
-                f.write(test_content)
-            
-            file_size = storage.get_file_size(file_path)
-            assert file_size == len(test_content)
-            
-            file_hash = storage.get_file_hash(file_path)
-            assert len(file_hash) == 32
-            
-            # Cleanup
-            storage.delete_file(file_path)
-            assert not os.path.exists(file_path)
-            
-        except Exception as e:
-            # Cleanup on error
-            if os.path.exists(file_path):
-                storage.delete_file(file_path)
-            raise e
+        # Write and hash in one pass
+        size, file_hash = await storage.write_and_hash(chunks(), file_path)
+        assert size == len(test_content)
+        assert file_hash == storage.get_file_hash(file_path)
+        assert len(file_hash) == 32
+        
+        file_size = await storage.get_file_size(file_path)
+        assert file_size == len(test_content)
+        
+        # Cleanup
+        await storage.delete_file(file_path)
+        assert not os.path.exists(file_path)
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
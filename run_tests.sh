@@ -53,7 +53,7 @@ run_tests() {
             if [ -d "venv" ]; then
                 source venv/bin/activate
             fi
-            python -m pytest tests/ -v --tb=short
+            python -m pytest tests/ -v --tb=short -n auto
         else
             # Frontend tests
             npm test